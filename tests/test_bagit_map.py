@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+
+import pytest
+
+from tools.gen.bagit_map import BagReceiver, ReceiveJournal, pack_and_transfer
+
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    source, transfer, destination = (tmp_path / name for name in ("source", "transfer", "destination"))
+    for folder in (source, transfer):
+        folder.mkdir()
+    (source / "a.txt").write_text("a")
+    (source / "b.txt").write_text("b")
+    return source, transfer, destination
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_receiver(dirs, use_inotify):
+    source, transfer, destination = dirs
+    receiver = BagReceiver(transfer, destination, max_attempts=2, retry_delay=0.05,
+                           use_inotify=use_inotify, poll_interval=0.05)
+    stop = threading.Event()
+    thread = threading.Thread(target=receiver.run, args=(stop,))
+    thread.start()
+    try:
+        # incomplete upload, never taken
+        (transfer / "partial.tar.part").write_bytes(b"incomplete")
+        tar_path = pack_and_transfer(source, transfer)
+        (transfer / "broken.tar").write_bytes(b"not a tar")
+
+        name = tar_path.name
+        assert wait_for(lambda: receiver.journal.done(name))
+        assert (destination / tar_path.stem / "data" / "a.txt").read_text() == "a"
+        assert wait_for(lambda: receiver.journal.attempts("broken.tar") == 2)
+    finally:
+        stop.set()
+        thread.join()
+
+    journal = ReceiveJournal(destination / ".received.jsonl")
+    assert journal.done(name)
+    assert not journal.done("broken.tar") and journal.attempts("broken.tar") == 2
+    assert journal.attempts("partial.tar.part") == 0
+    assert not list(destination.glob(".*.unpacking"))
+
+
+def run_receiver(receiver: BagReceiver):
+    stop = threading.Event()
+    thread = threading.Thread(target=receiver.run, args=(stop,))
+    thread.start()
+    return stop, thread
+
+
+def resend(tar_path) -> None:
+    """the same tar sent again: written as .part and renamed over the previous one"""
+    part = tar_path.with_name(f"{tar_path.name}.part")
+    part.write_bytes(tar_path.read_bytes())
+    os.utime(part, ns=(10 ** 18, 10 ** 18))
+    os.replace(part, tar_path)
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_resent_tar(dirs, use_inotify):
+    source, transfer, destination = dirs
+    receiver = BagReceiver(transfer, destination, use_inotify=use_inotify, poll_interval=0.05)
+    stop, thread = run_receiver(receiver)
+    try:
+        tar_path = pack_and_transfer(source, transfer)
+        assert wait_for(lambda: receiver.journal.done(tar_path.name))
+        resend(tar_path)
+        assert wait_for(lambda: receiver.journal.done(tar_path.name, tar_path.stat()))
+    finally:
+        stop.set()
+        thread.join()
+    lines = (destination / ".received.jsonl").read_text().splitlines()
+    assert sum('"done"' in line for line in lines) == 2
+
+
+def test_existing_tars_skipped_without_process_existing(dirs):
+    source, transfer, destination = dirs
+    tar_path = pack_and_transfer(source, transfer)
+    receiver = BagReceiver(transfer, destination, use_inotify=False, poll_interval=0.05, process_existing=False)
+    stop, thread = run_receiver(receiver)
+    try:
+        time.sleep(0.3)
+        assert not receiver.journal.done(tar_path.name)
+        # sent again while running: processed
+        resend(tar_path)
+        assert wait_for(lambda: receiver.journal.done(tar_path.name))
+    finally:
+        stop.set()
+        thread.join()
+
+
+@pytest.mark.parametrize("compression", [None, "zstd"])
+@pytest.mark.parametrize("volume_size", [None, 4096])
+def test_stream_pack(tmp_path, compression, volume_size):
+    from tools.checksums import is_valid_bag
+    from tools.gen.bag_stream import open_bag_tar, stream_pack
+    if compression:
+        pytest.importorskip("zstandard")
+    source = tmp_path / "source"
+    (source / "sub").mkdir(parents=True)
+    # random, so also compressed output needs several volumes
+    (source / "a.bin").write_bytes(os.urandom(25_600))
+    (source / "sub" / "b.txt").write_text("b")
+
+    path, throughput = stream_pack(source, tmp_path, "bag_x", compression=compression, volume_size=volume_size)
+    assert throughput.items == 2 and throughput.bytes == 25_601
+    if volume_size:
+        assert path.name.endswith(".vol") and len(list(tmp_path.glob("bag_x.tar*.[0-9][0-9][0-9]"))) > 1
+    assert not list(tmp_path.glob("*.part"))
+
+    with open_bag_tar(path) as tar:
+        tar.extractall(tmp_path / "out", filter="data")
+    assert is_valid_bag(tmp_path / "out" / "bag_x")
+    assert (tmp_path / "out" / "bag_x" / "data" / "sub" / "b.txt").read_text() == "b"
+
+
+def test_corrupt_volume(tmp_path):
+    from tools.gen.bag_stream import open_bag_tar, stream_pack
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "a.bin").write_bytes(b"a" * 50_000)
+    path, _ = stream_pack(source, tmp_path, "bag_x", volume_size=16_384)
+    with (tmp_path / "bag_x.tar.001").open("r+b") as f:
+        f.write(b"x")
+    with pytest.raises(ValueError, match="bag_x.tar.001"):
+        with open_bag_tar(path) as tar:
+            tar.extractall(tmp_path / "out", filter="data")
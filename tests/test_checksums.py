@@ -0,0 +1,64 @@
+import hashlib
+
+import bagit
+import pytest
+
+from tools.checksums import hash_file, hash_files, make_bag, validate_bag, is_valid_bag
+
+
+@pytest.fixture
+def bag_dir(tmp_path):
+    bag_dir = tmp_path / "bag"
+    (bag_dir / "sub").mkdir(parents=True)
+    (bag_dir / "a.txt").write_text("a" * 10_000)
+    (bag_dir / "sub" / "b.bin").write_bytes(bytes(range(256)) * 100)
+    (bag_dir / "empty").write_bytes(b"")
+    return bag_dir
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_hash_file(tmp_path, use_mmap):
+    path = tmp_path / "f"
+    path.write_bytes(b"x" * 100_000)
+    hashes = hash_file(path, ["md5", "sha256"], buffer_size=4096, use_mmap=use_mmap)
+    assert hashes == {"md5": hashlib.md5(b"x" * 100_000).hexdigest(),
+                      "sha256": hashlib.sha256(b"x" * 100_000).hexdigest()}
+
+
+def test_hash_files_pool(bag_dir):
+    paths = [p for p in bag_dir.rglob("*") if p.is_file()]
+    serial, _ = hash_files(paths, processes=1)
+    parallel, throughput = hash_files(paths, processes=2, pool_min_bytes=0)
+    assert serial == parallel
+    assert throughput.items == 3 and throughput.bytes == 10_000 + 25_600
+
+
+def test_make_bag_is_bagit_compatible(bag_dir):
+    bag = make_bag(bag_dir, {"Source-Organization": "test"}, processes=2)
+    assert bag.info["Payload-Oxum"] == f"{10_000 + 25_600}.3"
+    assert bagit.Bag(str(bag_dir)).is_valid()
+    assert is_valid_bag(bag_dir)
+    assert is_valid_bag(bag_dir, fast=True)
+
+
+def test_validate_bag_detects_changes(bag_dir):
+    make_bag(bag_dir, {})
+    # same size, different content: only the full validation notices
+    (bag_dir / "data" / "a.txt").write_text("b" * 10_000)
+    assert is_valid_bag(bag_dir, fast=True)
+    errors = validate_bag(bag_dir, processes=1).errors
+    assert errors == ["data/a.txt sha256 checksum mismatch", "data/a.txt sha512 checksum mismatch"]
+
+    (bag_dir / "data" / "extra").write_text("x")
+    assert not is_valid_bag(bag_dir, fast=True)
+    assert "data/extra not in manifest" in validate_bag(bag_dir).errors
+
+
+def test_validate_bag_checks_tag_files(bag_dir):
+    make_bag(bag_dir, {"Source-Organization": "test"})
+    assert is_valid_bag(bag_dir)
+    info = bag_dir / "bag-info.txt"
+    info.write_text(info.read_text().replace("test", "tset"))
+    assert validate_bag(bag_dir).errors == ["bag-info.txt sha256 checksum mismatch",
+                                            "bag-info.txt sha512 checksum mismatch"]
+    assert not bagit.Bag(str(bag_dir)).is_valid()
@@ -0,0 +1,133 @@
+import os
+import uuid
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+from sqlalchemy.pool import QueuePool
+
+from tools import create_db
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    yield f"sqlite:///{tmp_path / 'test.db'}"
+    create_db.dispose_engines()
+
+
+def test_engine_reuse(sqlite_url):
+    engine = create_db.engine_for_url(sqlite_url, poolclass=QueuePool, pool_size=2)
+    assert create_db.engine_for_url(sqlite_url, pool_size=2, poolclass=QueuePool) is engine
+    other = create_db.engine_for_url(sqlite_url, poolclass=QueuePool, pool_size=3)
+    assert other is not engine and other.pool.size() == 3
+    assert create_db.engine_for_url(sqlite_url, connect_args={"timeout": 1}) is create_db.engine_for_url(
+        sqlite_url, connect_args={"timeout": 1})
+    assert len(create_db.pool_stats()) == 3
+
+
+def test_pool_stats(sqlite_url):
+    engine = create_db.engine_for_url(sqlite_url, poolclass=QueuePool, pool_size=2)
+    with engine.connect() as conn:
+        conn.execute(sqlalchemy.text("SELECT 1"))
+        assert create_db.pool_stats()[sqlite_url]["checkedout"] == 1
+    stats = create_db.pool_stats()[sqlite_url]
+    assert stats["checkedout"] == 0
+    assert stats["size"] == 2
+
+
+SCHEMA = {"@schema": {"type": "object", "properties": {"n": {"type": "integer"}}, "required": ["n"]}}
+
+
+@pytest.fixture
+def docs_engine(sqlite_url):
+    engine = create_db.engine_for_url(sqlite_url)
+    create_db.Base.metadata.create_all(engine)
+    return engine
+
+
+def count_docs(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(sqlalchemy.text("SELECT count(*) FROM docs")).scalar()
+
+
+def test_bulk_insert_docs(docs_engine):
+    result = create_db.bulk_insert_docs(docs_engine, ({"n": i} for i in range(25)), SCHEMA, batch_size=10)
+    assert result.items == 25
+    assert count_docs(docs_engine) == 25
+
+
+def test_bulk_insert_invalid(docs_engine):
+    docs = [{"n": 1}, {"n": "x"}, {}]
+    with pytest.raises(ValueError):
+        create_db.bulk_insert_docs(docs_engine, docs, SCHEMA)
+    result = create_db.bulk_insert_docs(docs_engine, docs, SCHEMA, skip_invalid=True)
+    assert (result.items, result.skipped, len(result.errors)) == (1, 2, 2)
+
+
+def test_bulk_upsert(docs_engine):
+    create_db.bulk_insert_docs(docs_engine, [{"id": 1, "n": 1}, {"id": 2, "n": 2}], SCHEMA, id_key="id")
+    create_db.bulk_insert_docs(docs_engine, [{"id": 2, "n": 3}, {"id": 3, "n": 3}], SCHEMA, id_key="id")
+    assert count_docs(docs_engine) == 3
+    with docs_engine.connect() as conn:
+        data = conn.execute(sqlalchemy.select(create_db.Doc.data).where(create_db.Doc.id == 2)).scalar()
+    assert data["n"] == 3
+
+
+def test_bulk_upsert_unsupported(docs_engine, monkeypatch):
+    monkeypatch.setattr(docs_engine.dialect, "name", "mysql")
+    with pytest.raises(ValueError):
+        create_db.bulk_insert_docs(docs_engine, [{"id": 1, "n": 1}], SCHEMA, id_key="id")
+    assert count_docs(docs_engine) == 0
+
+
+def test_path_equals_json_values():
+    dialect = sqlalchemy.dialects.postgresql.psycopg2.dialect()
+
+    def compiled(value) -> tuple[str, list]:
+        query = create_db.DocQuery().path_equals("a.b", value).select().compile(dialect=dialect)
+        params = [(query.binds[name].type.bind_processor(dialect) or (lambda v: v))(param)
+                  for name, param in query.construct_params().items()]
+        return str(query).split("WHERE ")[1], params
+
+    assert compiled("x")[0].startswith("(data #>> '{a,b}') =") and compiled("x")[1] == ["x"]
+    for value, param in ((True, "true"), (None, "null"), (1, "1")):
+        assert compiled(value) == ("(data #> '{a,b}') = CAST(%(param_1)s::JSONB AS JSONB)", [param])
+
+
+@pytest.fixture
+def pg_engine():
+    # e.g. postgresql+psycopg2://postgres@/postgres?host=/tmp/pgdata
+    url = os.environ.get("TEST_PG_URL")
+    if not url:
+        pytest.skip("TEST_PG_URL not set")
+    # docs in a schema of its own, tables of the database are not touched
+    schema = f"test_docs_{uuid.uuid4().hex[:12]}"
+    admin = create_db.engine_for_url(url)
+    with admin.begin() as conn:
+        conn.execute(sqlalchemy.text(f"CREATE SCHEMA {schema}"))
+    engine = create_db.engine_for_url(url, connect_args={"options": f"-csearch_path={schema}"})
+    create_db.Base.metadata.create_all(engine)
+    create_db.bulk_insert_docs(engine, ({"n": i, "author": {"name": f"a{i % 10}"}} for i in range(200)), SCHEMA)
+    yield engine
+    create_db.dispose_engines()
+    with admin.begin() as conn:
+        conn.execute(sqlalchemy.text(f"DROP SCHEMA {schema} CASCADE"))
+    admin.dispose()
+
+
+def test_doc_indexes(pg_engine):
+    names = create_db.ensure_doc_indexes(pg_engine, schema={"@index": ["author.name"]})
+    assert set(names) <= set(create_db.list_doc_indexes(pg_engine))
+
+    query = create_db.DocQuery().path_equals("author.name", "a1").select()
+    assert create_db.uses_index(pg_engine, query, names[1], disable_seqscan=True)
+    query = create_db.DocQuery().contains({"author": {"name": "a1"}}).select()
+    assert create_db.uses_index(pg_engine, query, create_db.GIN_INDEX_NAME, disable_seqscan=True)
+    with pg_engine.connect() as conn:
+        assert len(conn.execute(query).all()) == 20
+        exists = create_db.DocQuery().path_exists("author.name").select()
+        assert len(conn.execute(exists).all()) == 200
+
+    create_db.ensure_doc_indexes(pg_engine, drop_unused=True)
+    assert names[1] not in create_db.list_doc_indexes(pg_engine)
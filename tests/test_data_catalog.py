@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from tools.data_catalog import DataCatalog
+from tools.files import save_json
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "a.csv").write_text("a,b\n1,2\n")
+    (tmp_path / "raw" / "b.json").write_text("{}")
+    (tmp_path / "raw" / "nested").mkdir()
+    (tmp_path / "raw" / "nested" / "c.csv").write_text("c\n" * 100)
+    save_json(tmp_path / "raw.json", {"@type": "Dataset", "name": "raw"})
+    return tmp_path
+
+
+def test_refresh_incremental(data_dir):
+    catalog = DataCatalog(data_dir)
+    assert catalog.refresh() == {"added": 4, "updated": 0, "removed": 0, "unchanged": 0}
+    assert catalog.refresh()["unchanged"] == 4
+
+    (data_dir / "raw" / "a.csv").write_text("changed")
+    (data_dir / "raw" / "b.json").unlink()
+    counts = catalog.refresh()
+    assert counts["updated"] == 1
+    assert counts["removed"] == 1
+
+
+def test_find(data_dir):
+    catalog = DataCatalog(data_dir)
+    catalog.refresh()
+    assert [e.path.name for e in catalog.find(suffix=".csv")] == ["a.csv", "c.csv"]
+    assert [e.path.name for e in catalog.find(min_size=100)] == ["c.csv"]
+    assert [e.path.name for e in catalog.find(name="b.*")] == ["b.json"]
+    assert len(catalog.find(folder="raw/nested")) == 1
+    entries = catalog.find(metadata={"@type": "Dataset"})
+    assert len(entries) == 3
+    assert entries[0].metadata["name"] == "raw"
+    assert entries[0].hash is not None
+
+
+def test_latest(data_dir):
+    catalog = DataCatalog(data_dir)
+    os.utime(data_dir / "raw" / "a.csv", ns=(1, 1))
+    assert catalog.latest(data_dir / "raw") == data_dir / "raw" / "b.json"
+    assert catalog.latest(data_dir / "raw", ".csv") == data_dir / "raw" / "a.csv"
+    # new files are picked up through the changed folder mtime
+    (data_dir / "raw" / "d.csv").write_text("d")
+    assert catalog.latest(data_dir / "raw", ".csv") == data_dir / "raw" / "d.csv"
+    # rewritten in place, the folder mtime stays the same: found after the next refresh
+    folder_mtime_ns = (data_dir / "raw").stat().st_mtime_ns
+    os.utime(data_dir / "raw" / "a.csv", ns=(2 * 10 ** 18, 2 * 10 ** 18))
+    assert (data_dir / "raw").stat().st_mtime_ns == folder_mtime_ns
+    assert catalog.latest(data_dir / "raw", ".csv") == data_dir / "raw" / "d.csv"
+    assert catalog.refresh("raw", hash_files=False)["updated"] == 1
+    assert catalog.latest(data_dir / "raw", ".csv") == data_dir / "raw" / "a.csv"
+
+
+def test_latest_is_an_index_lookup(data_dir, monkeypatch):
+    catalog = DataCatalog(data_dir)
+    catalog.refresh()
+
+    def no_scandir(path):
+        raise AssertionError(f"scandir {path}")
+
+    monkeypatch.setattr(os, "scandir", no_scandir)
+    assert catalog.latest(data_dir / "raw", ".csv") is not None
+
+
+def test_threads(data_dir):
+    from concurrent.futures import ThreadPoolExecutor
+
+    catalog = DataCatalog(data_dir)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: catalog.refresh() if i % 4 == 0 else catalog.find(suffix=".csv"), range(64)))
+    assert len(catalog.find()) == 4
+
+
+def test_latest_does_not_hash(data_dir):
+    catalog = DataCatalog(data_dir)
+    catalog.latest(data_dir / "raw")
+    assert all(entry.hash is None for entry in catalog.find(folder="raw"))
+    # hashed by the next full refresh
+    assert catalog.refresh()["updated"] == 2
+    assert all(entry.hash for entry in catalog.find(folder="raw"))
+
+
+def test_get_latest_file_outside_data_folder(tmp_path, monkeypatch):
+    from tools.files import get_latest_file
+
+    monkeypatch.delenv("PROJECT_ROOT", raising=False)
+    (tmp_path / "x.txt").write_text("x")
+    assert get_latest_file(tmp_path) == tmp_path / "x.txt"
@@ -0,0 +1,118 @@
+from pydantic import BaseModel
+
+from tools.data_logger import DataLog, data_log, flush, diff, Change, skipped_snapshots
+
+
+class Config(BaseModel):
+    factor: int
+
+
+def test_snapshots_and_lazy_diff(tmp_path):
+    @data_log(folder=tmp_path)
+    def scale(values: dict[str, int], config: Config, untyped=None) -> dict[str, int]:
+        return {key: value * config.factor for key, value in values.items()}
+
+    scale({"a": 1, "b": 2}, Config(factor=2))
+    scale({"a": 1, "b": 2}, Config(factor=2))
+    scale({"a": 1, "b": 3}, Config(factor=3))
+    flush()
+
+    log = DataLog(scale)
+    calls = log.calls()
+    assert len(calls) == 3
+    assert set(calls[0]["inputs"]) == {"values", "config"}
+    # deduplicated: 2 distinct values, 2 configs, 2 outputs
+    assert len(list(tmp_path.rglob("*.json.z"))) == 6
+    assert log.snapshot(calls[2], "config") == {"factor": 3}
+
+    assert log.diff(calls[0], calls[1]) == []
+    assert log.diff(calls[1], calls[2]) == [Change("a", "changed", 2, 3), Change("b", "changed", 4, 9)]
+    assert log.diff(calls[1], calls[2], "values") == [Change("b", "changed", 2, 3)]
+
+
+def test_sampling(tmp_path, monkeypatch):
+    @data_log(folder=tmp_path, sample_rate=0.0)
+    def never(x: int) -> int:
+        return x
+
+    @data_log(folder=tmp_path, max_per_second=2)
+    def bounded(x: int) -> int:
+        return x
+
+    for i in range(10):
+        never(i)
+        bounded(i)
+    monkeypatch.setenv("DATA_LOG", "0")
+
+    @data_log(folder=tmp_path)
+    def disabled(x: int) -> int:
+        return x
+
+    disabled(1)
+    flush()
+    assert DataLog(never).calls() == []
+    assert DataLog(disabled).calls() == []
+    assert 2 <= len(DataLog(bounded).calls()) <= 4
+
+
+def test_diff():
+    assert diff({"a": [1, 2], "b": 1}, {"a": [1, 3, 4], "c": 2}) == [
+        Change("a[1]", "changed", 2, 3), Change("a[2]", "added", None, 4),
+        Change("b", "removed", 1, None), Change("c", "added", None, 2)]
+
+
+def test_unserializable_values_do_not_change_the_call(tmp_path):
+    class Plain:
+        def __init__(self, value):
+            self.value = value
+
+    @data_log(folder=tmp_path)
+    def total(values: dict, extra: Plain) -> int:
+        return sum(values.values()) * 2 ** 70
+
+    skipped = skipped_snapshots()
+    # tuple keys and an int above 64 bit can't be serialized by orjson
+    assert total({(1, 2): 1}, Plain(1)) == 2 ** 70
+    flush()
+    assert skipped_snapshots() == skipped + 2
+    call = DataLog(total).calls()[0]
+    assert call["skipped"] == ["values", "return"] and call["output"] is None
+    # plain objects by their attributes, no repr with a memory address
+    assert DataLog(total).snapshot(call, "extra") == {"__type__": f"{Plain.__module__}.{Plain.__qualname__}",
+                                                      "value": 1}
+    assert DataLog(total).snapshot(call, "values") is None
+
+
+def test_snapshot_store_returns_copies(tmp_path):
+    import gc
+    import weakref
+
+    from tools.data_logger import SnapshotStore, snapshot_bytes
+
+    store = SnapshotStore(tmp_path)
+    digest = store.put(snapshot_bytes({"a": [1]}))
+    store.get(digest)["a"].append(2)
+    assert store.get(digest) == {"a": [1]}
+    # the cache belongs to the store, it does not keep it alive
+    ref = weakref.ref(store)
+    del store
+    gc.collect()
+    assert ref() is None
+
+
+def test_max_per_second_threads(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import tools.data_logger
+
+    # all calls fall into the same one second window
+    monkeypatch.setattr(tools.data_logger.time, "monotonic", lambda: 1.0)
+
+    @data_log(folder=tmp_path, max_per_second=50)
+    def bounded(x: int) -> int:
+        return x
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(bounded, range(2000)))
+    flush()
+    assert len(DataLog(bounded).calls()) == 50
@@ -0,0 +1,42 @@
+import csv
+import gzip
+
+import orjson
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+from tools import create_db
+from tools.db_export import export_query
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_db.engine_for_url(f"sqlite:///{tmp_path / 'test.db'}")
+    create_db.Base.metadata.create_all(engine)
+    create_db.bulk_insert_docs(engine, ({"n": i, "tags": ["a"]} for i in range(50)), {"@schema": {}})
+    yield engine
+    create_db.dispose_engines()
+
+
+def test_export_jsonl_gz(engine, tmp_path):
+    batches = []
+    result = export_query(engine, tmp_path / "docs.jsonl.gz", batch_size=20,
+                          progress=lambda tp: batches.append(tp.items))
+    assert result.items == 50
+    assert batches == [20, 40, 50]
+    lines = gzip.open(tmp_path / "docs.jsonl.gz").read().splitlines()
+    assert orjson.loads(lines[0]) == {"id": 1, "data": {"n": 0, "tags": ["a"]}}
+
+
+def test_export_csv_query(engine, tmp_path):
+    query = sqlalchemy.select(create_db.Doc.id, create_db.Doc.data).where(create_db.Doc.id <= 3)
+    assert export_query(engine, tmp_path / "docs.csv", query).items == 3
+    rows = list(csv.DictReader((tmp_path / "docs.csv").open(encoding="utf-8")))
+    assert rows[2] == {"id": "3", "data": '{"n":2,"tags":["a"]}'}
+
+
+def test_export_csv_no_rows(engine, tmp_path):
+    query = sqlalchemy.select(create_db.Doc.id, create_db.Doc.data).where(create_db.Doc.id < 0)
+    assert export_query(engine, tmp_path / "empty.csv", query).items == 0
+    assert (tmp_path / "empty.csv").read_bytes() == b"id,data\r\n"
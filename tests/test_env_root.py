@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from tools import env_root
+
+
+@pytest.fixture
+def fresh_root(monkeypatch):
+    monkeypatch.setattr(env_root, "__SET_ROOT", None)
+    monkeypatch.setattr(env_root, "__FIRST_ROOT_LOCATION", None)
+    # setenv records the original value, bootstrap writes os.environ directly
+    monkeypatch.setenv(env_root.PROJECT_ROOT_ENV, "")
+    monkeypatch.delenv(env_root.PROJECT_ROOT_ENV)
+    monkeypatch.chdir(os.getcwd())
+
+
+def test_root_from_env_var(fresh_root, tmp_path, monkeypatch):
+    monkeypatch.setenv(env_root.PROJECT_ROOT_ENV, str(tmp_path))
+    assert env_root.root(chdir=False) == tmp_path
+    assert os.getcwd() != str(tmp_path)
+
+
+def test_root_found_and_exported(fresh_root, tmp_path):
+    (tmp_path / ".env").touch()
+    (tmp_path / "pkg").mkdir()
+    assert env_root.root(str(tmp_path / "pkg"), chdir=False) == tmp_path
+    assert os.environ[env_root.PROJECT_ROOT_ENV] == str(tmp_path)
+    assert env_root.root() == tmp_path
+    with pytest.raises(Exception):
+        env_root.root(str(tmp_path / "pkg"))
+
+
+def test_explicit_path_wins_over_env(fresh_root, tmp_path, monkeypatch):
+    monkeypatch.setenv(env_root.PROJECT_ROOT_ENV, str(tmp_path / "inherited"))
+    (tmp_path / ".env").touch()
+    assert env_root.root(str(tmp_path), chdir=False) == tmp_path
+    assert os.environ[env_root.PROJECT_ROOT_ENV] == str(tmp_path)
+
+
+def test_env_fallback_without_env_file(fresh_root, tmp_path, monkeypatch):
+    monkeypatch.setenv(env_root.PROJECT_ROOT_ENV, str(tmp_path))
+    assert env_root.root("/", chdir=False) == tmp_path
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+
+from tools import files
+from tools.files import aio
+
+
+def test_save_load_and_chunks(tmp_path):
+    async def main():
+        await aio.save_json(tmp_path / "a.json", {"a": [1, 2, 3]})
+        assert await aio.load_json(tmp_path / "a.json") == {"a": [1, 2, 3]}
+        assert await aio.read_data(tmp_path / "a.json") == {"a": [1, 2, 3]}
+        (tmp_path / "big.bin").write_bytes(bytes(range(256)) * 1000)
+        chunks = [chunk async for chunk in aio.iter_chunks(tmp_path / "big.bin", chunk_size=10_000)]
+        assert len(chunks) == 26 and b"".join(chunks) == (tmp_path / "big.bin").read_bytes()
+
+    asyncio.run(main())
+
+
+def test_concurrent_reads_are_coalesced(tmp_path, monkeypatch):
+    calls = []
+    read_data = files.read_data
+
+    def slow_read_data(path, config=None):
+        calls.append(path)
+        time.sleep(0.05)
+        return read_data(path, config)
+
+    monkeypatch.setattr(files, "read_data", slow_read_data)
+    files.save_json(tmp_path / "a.json", {"a": 1})
+
+    async def main():
+        results = await asyncio.gather(*(aio.read_data(tmp_path / "a.json") for _ in range(10)))
+        assert all(result is results[0] for result in results)
+        await aio.read_data(tmp_path / "a.json")
+
+    asyncio.run(main())
+    assert len(calls) == 2
+
+
+def test_per_device_limit(tmp_path, monkeypatch):
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow_save_json(path, data, indent_2=True):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    monkeypatch.setattr(files, "save_json", slow_save_json)
+    aio.configure(max_workers=8, per_device=2)
+    try:
+        async def main():
+            await asyncio.gather(*(aio.save_json(tmp_path / f"{i}.json", {}) for i in range(8)))
+
+        asyncio.run(main())
+    finally:
+        aio.configure()
+    assert peak[0] == 2
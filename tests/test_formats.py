@@ -0,0 +1,63 @@
+import gzip
+
+import pytest
+
+from tools.files import iter_data, read_data, save_data, save_json
+from tools.files.formats import Format, detect, formats
+
+ROWS = [{"id": "1", "name": "a"}, {"id": "2", "name": "b"}]
+
+
+@pytest.mark.parametrize("name", ["rows.jsonl", "rows.jsonl.gz", "rows.csv.bz2", "rows.yml", "rows.json.xz"])
+def test_roundtrip(tmp_path, name):
+    save_data(tmp_path / name, ROWS)
+    assert read_data(tmp_path / name) == ROWS
+
+
+def test_streaming(tmp_path):
+    save_data(tmp_path / "rows.csv.gz", ROWS)
+    assert next(iter_data(tmp_path / "rows.csv.gz")) == ROWS[0]
+    save_json(tmp_path / "rows.json", ROWS)
+    with pytest.raises(NotImplementedError):
+        iter_data(tmp_path / "rows.json")
+
+
+def test_detect_by_content(tmp_path):
+    (tmp_path / "export").write_bytes(gzip.compress(b'  {"a": 1}'))
+    fmt, compression = detect(tmp_path / "export")
+    assert type(fmt).__name__ == "Json" and compression == ".gz"
+    assert read_data(tmp_path / "export") == {"a": 1}
+    (tmp_path / "unknown").write_bytes(b"\x00\x01")
+    with pytest.raises(NotImplementedError):
+        read_data(tmp_path / "unknown")
+
+
+def test_plugin_and_multi_suffix(tmp_path, monkeypatch):
+    # registered into a copy, the global registry is restored after the test
+    monkeypatch.setattr(formats, "_classes", dict(formats._classes))
+
+    @formats.register("upper-text")
+    class UpperText(Format):
+        suffixes = (".upper.txt",)
+
+        def read(self, f, config):
+            return f.read().decode().upper()
+
+    (tmp_path / "a.upper.txt").write_text("abc")
+    assert read_data(tmp_path / "a.upper.txt") == "ABC"
+    with pytest.raises(NotImplementedError):
+        read_data(tmp_path / "a.txt")
+
+    monkeypatch.undo()
+    assert "upper-text" not in formats.list_all()
+
+
+def test_csv_empty(tmp_path):
+    save_data(tmp_path / "empty.csv", [], {"fieldnames": ["id", "name"]})
+    assert (tmp_path / "empty.csv").read_bytes() == b"id,name\r\n"
+    assert read_data(tmp_path / "empty.csv") == []
+    save_data(tmp_path / "empty.csv", [{"id": "1", "name": "a"}], {"fieldnames": ["id", "name"]})
+    assert read_data(tmp_path / "empty.csv") == [{"id": "1", "name": "a"}]
+    # without fieldnames there is no header to write
+    save_data(tmp_path / "none.csv", [])
+    assert (tmp_path / "none.csv").read_bytes() == b""
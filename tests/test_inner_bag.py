@@ -0,0 +1,88 @@
+import os
+
+import bagit
+
+from tools.checksums import make_bag
+from tools.experiment.inner_bag import MBag
+
+
+def test_add_paths_incremental(tmp_path):
+    bag_dir = tmp_path / "bag"
+    bag_dir.mkdir()
+    (bag_dir / "existing.txt").write_text("existing")
+    mbag = MBag(bag_dir, bagit.make_bag(str(bag_dir), {}))
+    (tmp_path / "new.txt").write_text("new file")
+    (tmp_path / "folder").mkdir()
+    (tmp_path / "folder" / "inner.txt").write_text("inner")
+
+    mbag.add_paths([tmp_path / "new.txt", tmp_path / "folder"])
+    assert mbag._bag.info["Payload-Oxum"] == f"{8 + 8 + 5}.3"
+    assert mbag.validate()
+    assert mbag.validate(fast=True)
+    assert "data/folder/inner.txt" in mbag._bag.payload_entries()
+
+
+def test_copy_cache_skips_unchanged(tmp_path):
+    bag_dir = tmp_path / "bag"
+    bag_dir.mkdir()
+    mbag = MBag(bag_dir, make_bag(bag_dir, {}))
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "a.txt").write_text("aaaa")
+    (source / "b.txt").write_text("bbbb")
+
+    mbag.add_paths([source], ["copy_cache"])
+    assert mbag.copy_report.files["skipped"] == 0
+    assert mbag.copy_report.bytes["copy"] + mbag.copy_report.bytes["reflink"] == 8
+
+    # touched but same content: hash matches the manifest
+    os.utime(source / "a.txt", (0, 0))
+    (source / "b.txt").write_text("changed")
+    mbag.add_paths([source], ["copy_cache"])
+    assert mbag.copy_report.files["skipped"] == 1
+    assert (bag_dir / "data/source/b.txt").read_text() == "changed"
+    assert mbag._bag.info["Payload-Oxum"] == f"{4 + 7}.2"
+    assert mbag.validate()
+
+    mbag.add_paths([source], ["copy_cache"])
+    assert mbag.copy_report.skipped_bytes == 11 and mbag.copy_report.copied_bytes == 0
+
+
+def test_copy_cache_hardlink(tmp_path):
+    bag_dir = tmp_path / "bag"
+    bag_dir.mkdir()
+    mbag = MBag(bag_dir, make_bag(bag_dir, {}))
+    (tmp_path / "a.txt").write_text("aaaa")
+
+    mbag.add_paths([tmp_path / "a.txt"], ["copy_cache"], hardlink=True)
+    assert mbag.copy_report.files["hardlink"] == 1
+    assert (bag_dir / "data/a.txt").samefile(tmp_path / "a.txt")
+
+    # changed through the link, the manifest and oxum follow
+    (tmp_path / "a.txt").write_text("changed!")
+    mbag.add_paths([tmp_path / "a.txt"], ["copy_cache"], hardlink=True)
+    assert mbag._bag.info["Payload-Oxum"] == "8.1"
+    assert mbag.validate()
+
+
+def test_copy_cache_links_known_content(tmp_path):
+    bag_dir = tmp_path / "bag"
+    bag_dir.mkdir()
+    mbag = MBag(bag_dir, make_bag(bag_dir, {}))
+    (tmp_path / "a.txt").write_text("aaaa")
+    mbag.add_paths([tmp_path / "a.txt"], ["copy_cache"])
+
+    # same content under a new name: taken from the payload file, the source is not linked
+    (tmp_path / "renamed.txt").write_text("aaaa")
+    mbag.add_paths([tmp_path / "renamed.txt"], ["copy_cache"], hardlink=True)
+    assert mbag.copy_report.files["hardlink"] == 1
+    assert (bag_dir / "data/renamed.txt").samefile(bag_dir / "data/a.txt")
+    assert not (bag_dir / "data/renamed.txt").samefile(tmp_path / "renamed.txt")
+    assert mbag.validate()
+
+    # same size, other content: copied from the source
+    (tmp_path / "other.txt").write_text("bbbb")
+    mbag.add_paths([tmp_path / "other.txt"], ["copy_cache"])
+    assert (bag_dir / "data/other.txt").read_text() == "bbbb"
+    assert mbag._bag.info["Payload-Oxum"] == "12.3"
+    assert mbag.validate()
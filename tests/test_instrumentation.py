@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from tools import instrumentation
+from tools.files import read_data, save_json
+
+
+@pytest.fixture
+def enabled():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_disabled_records_nothing(tmp_path):
+    instrumentation.reset()
+    instrumentation.disable()
+    save_json(tmp_path / "a.json", {"a": 1})
+    with instrumentation.timer("block"):
+        instrumentation.count("rows")
+    assert instrumentation.snapshot() == {"operations": {}, "counters": {}}
+
+
+def test_operations_and_export(tmp_path, enabled):
+    save_json(tmp_path / "a.json", {"a": 1})
+    read_data(tmp_path / "a.json")
+    with pytest.raises(FileNotFoundError):
+        read_data(tmp_path / "missing.json")
+    instrumentation.count("rows", 3)
+
+    data = instrumentation.snapshot()
+    assert data["operations"]["files.read_data"]["count"] == 2
+    assert data["operations"]["files.read_data"]["errors"] == 1
+    assert data["operations"]["files.save_json"]["buckets"]["+Inf"] == 1
+    assert data["counters"] == {"rows": 3}
+    assert json.loads(instrumentation.to_json()) == data
+
+    text = instrumentation.to_prometheus()
+    assert 'tools_operation_duration_seconds_count{operation="files.read_data"} 2' in text
+    assert 'tools_operation_errors_total{operation="files.read_data"} 1' in text
+    assert "tools_rows_total 3" in text
+
+
+def test_typer_metrics_command(tmp_path, enabled):
+    typer = pytest.importorskip("typer")
+    from typer.testing import CliRunner
+    from tools.typer_log import add_metrics_command
+
+    save_json(tmp_path / "a.json", {"a": 1})
+    log_fp = tmp_path / "typer-log.jsonl"
+    log_fp.write_text(json.dumps({"type": "command", "command": "load", "metrics": instrumentation.snapshot()}) + "\n")
+    app = typer.Typer(name="app")
+    add_metrics_command(app, log_fp)
+    result = CliRunner().invoke(app, ["--format", "json"])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["operations"]["files.save_json"]["count"] == 1
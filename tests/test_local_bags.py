@@ -0,0 +1,29 @@
+import shutil
+
+import bagit
+
+from tools.checksums import make_bag
+from tools.experiment.inner_bag import MBag
+from tools.local_bags import BagCatalog
+
+
+def test_bag_catalog(tmp_path):
+    for name, organization in [("survey_a", "lab"), ("survey_b", "field")]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "file.txt").write_text(name)
+        make_bag(tmp_path / name, {"Source-Organization": organization, "Bagging-Date": "2024-05-01"})
+    catalog = BagCatalog(tmp_path)
+
+    assert catalog.reconcile() == {"added": 2, "updated": 0, "removed": 0, "unchanged": 0}
+    assert catalog.reconcile()["unchanged"] == 2
+    assert [e.name for e in catalog.search(info={"Source-Organization": "lab"})] == ["survey_a"]
+    entry = catalog.get("survey_b")
+    assert (entry.octets, entry.streams, entry.created) == (8, 1, "2024-05-01")
+    assert entry.size > entry.octets
+    assert not catalog.search(created_from="2025-01-01")
+
+    (tmp_path / "more.txt").write_text("more")
+    MBag(tmp_path / "survey_a", bagit.Bag(str(tmp_path / "survey_a"))).add_paths([tmp_path / "more.txt"])
+    shutil.rmtree(tmp_path / "survey_b")
+    assert catalog.reconcile() == {"added": 0, "updated": 1, "removed": 1, "unchanged": 0}
+    assert catalog.get("survey_a").streams == 2
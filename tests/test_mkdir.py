@@ -0,0 +1,40 @@
+import orjson
+
+from pathlib import Path
+
+from tools.mkdir import SmartPath
+
+
+def test_join_keeps_all_segments(tmp_path):
+    base = SmartPath(tmp_path / "base", exist="create")
+    joined = base / "a" / "b"
+    assert joined == tmp_path / "base" / "a" / "b"
+    assert isinstance(joined, SmartPath)
+    assert joined.is_dir()
+
+
+def test_derived_paths_are_plain(tmp_path):
+    base = SmartPath(tmp_path / "base", exist="create")
+    # parent, joinpath and glob results do not create folders
+    assert type(base.parent) is not SmartPath and isinstance(base.parent, Path)
+    derived = base.joinpath("x", "y")
+    assert derived == tmp_path / "base" / "x" / "y"
+    assert not derived.exists()
+    (base / "f.txt").write_text("f")
+    assert [type(p) for p in base.glob("*.txt")] == [type(Path())]
+
+
+def test_tuple_keywords(tmp_path):
+    base = SmartPath(tmp_path, exist="create")
+    written = base / ("overwrite", "meta.json", {"a": 1})
+    assert orjson.loads(written.read_bytes()) == {"a": 1}
+    # (exist, path): the first element is the exist keyword
+    assert (base / ("create", "deep")).is_dir()
+
+
+def test_versioned(tmp_path):
+    (tmp_path / "run_0.txt").write_text("0")
+    (tmp_path / "run_3.txt").write_text("3")
+    versioned = SmartPath(tmp_path / "run.txt").versioned()
+    assert versioned == tmp_path / "run_4.txt"
+    assert not versioned.exists()
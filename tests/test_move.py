@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import os
+import time
+
+import pytest
+
+from tools.checksums import is_valid_bag, make_bag
+from tools.move import LocalBackend, S3Backend, TokenBucket, transfer_bag, backend_from_url, file_chunk_size
+
+
+@pytest.fixture
+def bag_dir(tmp_path):
+    bag_dir = tmp_path / "bags" / "bag_x"
+    bag_dir.mkdir(parents=True)
+    (bag_dir / "big.bin").write_bytes(os.urandom(100_000))
+    # sorted before big.bin: transferred completely before it
+    (bag_dir / "a_small.txt").write_text("small")
+    make_bag(bag_dir, {}, processes=1)
+    return bag_dir
+
+
+def test_transfer_and_skip(bag_dir, tmp_path):
+    destination = backend_from_url(f"file://{tmp_path / 'dest'}")
+    result = transfer_bag(bag_dir, destination, chunk_size=16_384)
+    assert not result.errors and result.skipped == 0
+    assert is_valid_bag(tmp_path / "dest" / "bag_x")
+    assert not list((tmp_path / "dest").rglob("*.part"))
+    assert not (bag_dir.parent / ".bag_x.transfer.jsonl").exists()
+
+    # payload already there with the same checksums
+    again = transfer_bag(bag_dir, destination, chunk_size=16_384)
+    assert again.skipped == 2 and again.bytes < 100_000
+
+
+class FailingBackend(LocalBackend):
+    def __init__(self, root, fail_after: int):
+        super().__init__(root)
+        self.fail_after = fail_after
+
+    def write_chunk(self, path, state, index, offset, data):
+        if path.endswith("big.bin") and index >= self.fail_after:
+            raise ConnectionError("connection lost")
+        return super().write_chunk(path, state, index, offset, data)
+
+
+def test_resume(bag_dir, tmp_path):
+    with pytest.raises(ConnectionError):
+        transfer_bag(bag_dir, FailingBackend(tmp_path / "dest", fail_after=3), chunk_size=10_000, workers=1)
+    assert (bag_dir.parent / ".bag_x.transfer.jsonl").exists()
+
+    result = transfer_bag(bag_dir, LocalBackend(tmp_path / "dest"), chunk_size=10_000, workers=1)
+    assert not result.errors
+    # only the 7 missing chunks of big.bin and the tag files were sent, a_small.txt was done in the first run
+    tag_bytes = sum(p.stat().st_size for p in bag_dir.iterdir() if p.is_file())
+    assert result.bytes == 70_000 + tag_bytes
+    assert is_valid_bag(tmp_path / "dest" / "bag_x")
+
+
+def test_resume_changed_source(bag_dir, tmp_path):
+    with pytest.raises(ConnectionError):
+        transfer_bag(bag_dir, FailingBackend(tmp_path / "dest", fail_after=3), chunk_size=10_000, workers=1)
+    big = bag_dir / "data" / "big.bin"
+    # same content, new mtime: sent again completely
+    os.utime(big, ns=(1, 1))
+    result = transfer_bag(bag_dir, LocalBackend(tmp_path / "dest"), chunk_size=10_000, workers=1)
+    tag_bytes = sum(p.stat().st_size for p in bag_dir.iterdir() if p.is_file())
+    assert not result.errors and result.bytes == 100_000 + tag_bytes
+
+    (tmp_path / "dest").rename(tmp_path / "old")
+    with pytest.raises(ConnectionError):
+        transfer_bag(bag_dir, FailingBackend(tmp_path / "dest", fail_after=3), chunk_size=10_000, workers=1)
+    big.write_bytes(os.urandom(100_000))
+    result = transfer_bag(bag_dir, LocalBackend(tmp_path / "dest"), chunk_size=10_000, workers=1)
+    assert "bag_x/data/big.bin: source differs from the sha256 manifest" in result.errors
+
+
+def test_file_chunk_size():
+    assert file_chunk_size(100, 8, None) == 8
+    assert file_chunk_size(100 * 1000 ** 3, 8 * 1024 ** 2, 10_000) == 10_000_000
+    assert file_chunk_size(1000, 8, 10_000) == 8
+
+
+class FakeS3:
+    """the calls of S3Backend on a dict"""
+
+    class exceptions:
+        class ClientError(Exception):
+            def __init__(self, code):
+                self.response = {"Error": {"Code": code}}
+
+    def __init__(self):
+        self.objects, self.uploads, self.reads = {}, {}, 0
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.exceptions.ClientError("404")
+        return {"ContentLength": len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key):
+        self.reads += 1
+        content = self.objects[Key]
+
+        class Body:
+            def iter_chunks(self, size):
+                yield content
+        return {"Body": Body()}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.uploads[Key] = {}
+        return {"UploadId": Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        assert base64.b64decode(ContentMD5) == hashlib.md5(Body).digest()
+        assert 1 <= PartNumber <= SmallS3.max_chunks
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": f"etag{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+
+class SmallS3(S3Backend):
+    min_chunk_size = 1
+    max_chunks = 3
+
+
+def test_s3_parts_and_verification(bag_dir):
+    client = FakeS3()
+    result = transfer_bag(bag_dir, SmallS3("bucket", "bags", client=client), chunk_size=10_000)
+    assert not result.errors
+    assert client.objects["bags/bag_x/data/big.bin"] == (bag_dir / "data" / "big.bin").read_bytes()
+    # remote destinations are verified by size, nothing is downloaded
+    assert client.reads == 0
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100_000, burst=10_000)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.consume(10_000)
+    # burst free, then 40_000 bytes at 100_000/s
+    assert 0.3 < time.monotonic() - start < 1.0
@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO = Path(__file__).parent.parent
+
+
+def test_get_logger_fresh_data_folder(tmp_path):
+    # new process: the root and the logging manager are set once per process
+    env = {**os.environ, "PROJECT_ROOT": str(tmp_path), "PROJECT_ROOT_CHDIR": "0", "PYTHONPATH": str(REPO)}
+    code = "from tools.project_logging import get_logger; get_logger('tools/example.py').info('hello')"
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=REPO, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / "data" / "log_conf.json").is_file()
+    assert "hello" in (tmp_path / "data" / "logs" / "app.log").read_text()
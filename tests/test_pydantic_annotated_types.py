@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Annotated
+
+import orjson
+from pydantic import BaseModel, PlainSerializer
+
+from tools.files import save_json
+from tools.pydantic_annotated_types import (FastSerializableDatetime, FastSerializableDatetimeAlways,
+                                            FastSerializablePath, SerializableDatetimeAlways, SerializablePath,
+                                            dump_models)
+
+
+class Old(BaseModel):
+    updated: SerializableDatetimeAlways
+    source: SerializablePath
+
+
+class Fast(BaseModel):
+    created: FastSerializableDatetime
+    updated: FastSerializableDatetimeAlways
+    source: FastSerializablePath
+
+
+NOW = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def test_fast_types_match_lambdas():
+    old = Old(updated=NOW, source=Path("/data/a.json"))
+    fast = Fast(created=NOW, updated=NOW, source=Path("/data/a.json"))
+    assert fast.model_dump(include={"updated", "source"}) == old.model_dump()
+    assert isinstance(fast.model_dump()["created"], datetime)
+    assert orjson.loads(fast.model_dump_json())["created"] == "2024-05-01T12:30:15.123456Z"
+    assert Fast.model_validate_json(fast.model_dump_json()) == fast
+    assert orjson.loads(fast.model_dump_json(include={"updated", "source"})) == orjson.loads(old.model_dump_json())
+
+
+def test_dump_models_and_save_json(tmp_path):
+    models = [Fast(created=NOW, updated=NOW, source=Path(f"/data/{i}.json")) for i in range(3)]
+    expected = [{"created": "2024-05-01T12:30:15.123456Z", "updated": NOW.isoformat(), "source": f"/data/{i}.json"}
+                for i in range(3)]
+    assert orjson.loads(dump_models(models)) == expected
+    assert dump_models([]) == b"[]"
+    save_json(tmp_path / "models.json", {"models": models})
+    assert orjson.loads((tmp_path / "models.json").read_bytes()) == {"models": expected}
+
+
+class JsonOnly(BaseModel):
+    x: Annotated[int, PlainSerializer(lambda v: f"#{v}", when_used="json")]
+
+
+def test_json_only_serializers(tmp_path):
+    models = [JsonOnly(x=1), JsonOnly(x=2)]
+    save_json(tmp_path / "models.json", models, indent_2=False)
+    assert (tmp_path / "models.json").read_bytes() == dump_models(models) == b'[{"x":"#1"},{"x":"#2"}]'
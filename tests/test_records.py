@@ -0,0 +1,80 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+pytest.importorskip("msgpack")
+
+from tools.files import read_data, save_records
+from tools.pydantic_annotated_types import FastSerializableDatetime, FastSerializablePath
+from tools.records import RecordFile, write_records
+
+
+class Measurement(BaseModel):
+    id: int
+    taken: FastSerializableDatetime
+    source: FastSerializablePath
+    values: list[float]
+
+
+def measurements(count: int) -> list[Measurement]:
+    return [Measurement(id=i, taken=datetime(2024, 1, 1, 12, 0, i % 60), source=Path(f"/data/{i}.csv"),
+                        values=[i, i / 2]) for i in range(count)]
+
+
+def test_roundtrip_by_index(tmp_path):
+    path = tmp_path / "m.records"
+    assert save_records(path, measurements(1000)) == 1000
+    with read_data(path, {"model": Measurement}) as data:
+        assert len(data) == 1000
+        assert data[0] == measurements(1)[0]
+        assert data[-1].id == 999 and data[999].source == Path("/data/999.csv")
+        assert [m.id for m in data[10:13]] == [10, 11, 12]
+        assert data.raw(5)["taken"] == "2024-01-01T12:00:05"
+        assert data.header["model"].endswith("Measurement")
+        with pytest.raises(IndexError):
+            data[1000]
+
+
+class Plain(BaseModel):
+    id: int
+    name: Optional[str]
+    values: list[float]
+
+
+class Nested(BaseModel):
+    measurement: Measurement
+
+
+def test_without_validation(tmp_path):
+    write_records(tmp_path / "m.records", measurements(3))
+    with RecordFile(tmp_path / "m.records", Measurement, validate=False) as data:
+        assert data.validate
+        assert isinstance(data[1].taken, datetime) and isinstance(data[1].source, Path)
+        assert data[1] == measurements(3)[1]
+    write_records(tmp_path / "n.records", [Nested(measurement=m) for m in measurements(2)])
+    with RecordFile(tmp_path / "n.records", Nested, validate=False) as data:
+        assert isinstance(data[0].measurement, Measurement)
+    write_records(tmp_path / "p.records", [Plain(id=1, name=None, values=[0.5])])
+    with RecordFile(tmp_path / "p.records", Plain, validate=False) as data:
+        assert not data.validate
+        assert data[0] == Plain(id=1, name=None, values=[0.5])
+
+
+def test_dicts_and_empty(tmp_path):
+    write_records(tmp_path / "m.records", measurements(3))
+    with RecordFile(tmp_path / "m.records") as data:
+        assert list(data)[2]["id"] == 2
+    assert write_records(tmp_path / "empty.records", [], Measurement) == 0
+    with RecordFile(tmp_path / "empty.records", Measurement) as data:
+        assert len(data) == 0 and data.fields == list(Measurement.model_fields)
+
+
+def test_incomplete_file(tmp_path):
+    path = tmp_path / "m.records"
+    write_records(path, measurements(10))
+    path.write_bytes(path.read_bytes()[:-4])
+    with pytest.raises(ValueError):
+        RecordFile(path)
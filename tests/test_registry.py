@@ -1,5 +1,8 @@
+import os
+import sys
+
 import pytest
-from tools.class_registry import Registry
+from tools.class_registry import Registry, build_manifest, manifest_path, _module_name
 
 @pytest.fixture
 def registry():
@@ -14,4 +17,74 @@ def test_b(registry):
     assert registry is not None
 
 def test_load_instances(registry):
-    registry.load_instances()
\ No newline at end of file
+    registry.load_instances()
+
+PLUGIN = '''
+import tests.test_registry as t
+
+
+@t.plugin_registry.register("{name}")
+class Plugin:
+    pass
+'''
+
+plugin_registry = None
+
+
+@pytest.fixture
+def plugin_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys.modules[__name__], "plugin_registry", Registry(tmp_path))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    instances = tmp_path / "plugins"
+    instances.mkdir()
+    for name in ["alpha", "beta"]:
+        (instances / f"{name}.py").write_text(PLUGIN.format(name=name))
+    return instances
+
+
+def test_lazy_load_instances(plugin_folder):
+    plugin_registry.load_instances("plugins", lazy=True)
+    assert plugin_registry.list_all() == ["alpha", "beta"]
+    alpha, beta = (_module_name(plugin_folder / f"{name}.py") for name in ("alpha", "beta"))
+    assert alpha not in sys.modules
+    assert plugin_registry.get("alpha").__name__ == "Plugin"
+    assert alpha in sys.modules
+    assert beta not in sys.modules
+    # the index is kept in the cache dir, not in the plugin folder
+    assert manifest_path(plugin_folder).is_relative_to(plugin_folder.parent / "cache")
+    assert manifest_path(plugin_folder).exists()
+    assert not list(plugin_folder.glob("*.json"))
+
+
+def test_registered_classes_pickle(plugin_folder):
+    import pickle
+
+    plugin_registry.load_instances("plugins")
+    plugin = plugin_registry.create("alpha")
+    assert type(pickle.loads(pickle.dumps(plugin))) is plugin_registry.get("alpha")
+
+
+def test_lazy_failed_import_is_retried(plugin_folder):
+    (plugin_folder / "broken.py").write_text(PLUGIN.format(name="broken") + "raise RuntimeError('broken')\n")
+    plugin_registry.load_instances("plugins", lazy=True)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            plugin_registry.get("broken")
+    assert "broken" in plugin_registry.list_all()
+    (plugin_folder / "broken.py").write_text(PLUGIN.format(name="broken"))
+    assert plugin_registry.get("broken").__name__ == "Plugin"
+
+
+def test_manifest_invalidated_by_mtime(plugin_folder):
+    assert set(build_manifest(plugin_folder)) == {"alpha", "beta"}
+    (plugin_folder / "beta.py").write_text(PLUGIN.format(name="gamma"))
+    os.utime(plugin_folder / "beta.py", ns=(1, 1))
+    assert set(build_manifest(plugin_folder)) == {"alpha", "gamma"}
+
+
+def test_parallel_load_stats(plugin_folder):
+    plugin_registry.load_instances("plugins", parallel=True, trace_memory=True)
+    assert plugin_registry.list_all() == ["alpha", "beta"]
+    stats = plugin_registry.load_stats()
+    assert sorted(s.registered[0] for s in stats) == ["alpha", "beta"]
+    assert all(s.memory_bytes is not None and s.total_seconds > 0 for s in stats)
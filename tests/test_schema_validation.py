@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("jsonschema")
+
+from tools.schema_validation import get_validator, validate, validate_many
+
+SCHEMA = {"type": "object", "properties": {"n": {"type": "integer"}, "s": {"type": "string"}}, "required": ["n"]}
+
+
+def test_validator_cached_by_schema_hash():
+    assert get_validator(SCHEMA) is get_validator(dict(SCHEMA))
+
+
+def test_validate():
+    validate({"n": 1}, SCHEMA)
+    with pytest.raises(ValueError):
+        validate({"n": "1"}, SCHEMA)
+
+
+def test_validate_many_all_errors():
+    errors = validate_many([{"n": 1}, {"n": "x", "s": 2}, {}], SCHEMA)
+    assert [idx for idx, _ in errors] == [1, 1, 2]
+
+
+def test_fastjsonschema_backend():
+    pytest.importorskip("fastjsonschema")
+    errors = validate_many([{"n": 1}, {"n": "x", "s": 2}, {}], SCHEMA, backend="fastjsonschema")
+    assert [idx for idx, _ in errors] == [1, 2]
@@ -12,4 +12,72 @@ def test_xml_to_yaml():
 
 def test_yaml_to_xml():
     output_xml = yaml_to_xml((test_path / "out.yaml").read_text())
-    (test_path / "in_round.xml").write_text(output_xml)
\ No newline at end of file
+    (test_path / "in_round.xml").write_text(output_xml)
+
+RECORDS_XML = b'''<export>
+    <item id="1"><View><Choice value="a"/><Choice value="b"/></View><name>Ada</name></item>
+    <item id="2"><name>Bob</name></item>
+</export>'''
+
+
+def test_iter_xml_records_matches_xml_to_dict(tmp_path):
+    import xml.etree.ElementTree as ET
+    from tools.xml2yaml import iter_xml_records, xml_to_dict
+    (tmp_path / "in.xml").write_bytes(RECORDS_XML)
+    assert list(iter_xml_records(tmp_path / "in.xml")) == [xml_to_dict(ET.fromstring(RECORDS_XML))]
+
+
+def test_iter_xml_records_deep(tmp_path):
+    from tools.xml2yaml import iter_xml_records
+    depth = 5000
+    (tmp_path / "deep.xml").write_text("<a>" * depth + "</a>" * depth)
+    record = next(iter_xml_records(tmp_path / "deep.xml"))
+    for _ in range(depth - 1):
+        record = record["a"]
+    assert record == {}
+
+
+def test_xml_file_to_jsonl(tmp_path):
+    import orjson
+    from tools.xml2yaml import xml_file_to_jsonl, xml_file_to_yaml
+    (tmp_path / "in.xml").write_bytes(RECORDS_XML)
+    assert xml_file_to_jsonl(tmp_path / "in.xml", tmp_path / "out.jsonl", "item", text_key="#text") == 2
+    records = [orjson.loads(line) for line in (tmp_path / "out.jsonl").read_bytes().splitlines()]
+    assert records[1] == {"id": "2", "name": {"#text": "Bob"}}
+    assert records[0]["View"][0]["Choice"] == [{"value": "a"}, {"value": "b"}]
+    assert xml_file_to_yaml(tmp_path / "in.xml", tmp_path / "out.yaml", "item") == 2
+
+
+def test_yaml_documents_roundtrip(tmp_path):
+    from pathlib import Path
+    from tools.files import save_yaml, read_data, save_yaml_documents, iter_yaml_documents
+    save_yaml(tmp_path / "one.yaml", {"path": Path("a/b"), "n": [1, 2]})
+    assert read_data(tmp_path / "one.yaml") == {"path": "a/b", "n": [1, 2]}
+    save_yaml_documents(tmp_path / "many.yaml", ({"i": i} for i in range(3)))
+    assert list(iter_yaml_documents(tmp_path / "many.yaml")) == [{"i": 0}, {"i": 1}, {"i": 2}]
+
+
+def test_convert_directory(tmp_path):
+    from tools.xml2yaml import convert_directory
+    (tmp_path / "src" / "sub").mkdir(parents=True)
+    (tmp_path / "src" / "a.xml").write_text('<View><Header value="a"/></View>')
+    (tmp_path / "src" / "sub" / "b.xml").write_text('<View><Header value="b"/></View>')
+    (tmp_path / "src" / "broken.xml").write_text('<View>')
+    result = convert_directory(tmp_path / "src", tmp_path / "out", workers=2)
+    assert (result.items, len(result.errors)) == (2, 1)
+    assert (tmp_path / "out" / "sub" / "b.yaml").exists()
+    assert convert_directory(tmp_path / "src", tmp_path / "out", workers=2).skipped == 2
+
+
+def test_convert_directory_reverse_needs_destination(tmp_path):
+    import pytest
+    from tools.xml2yaml import convert_directory
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.xml").write_text('<View><Header value="a"/></View>')
+    convert_directory(tmp_path / "src", workers=1)
+    for destination in (None, tmp_path / "src"):
+        with pytest.raises(ValueError):
+            convert_directory(tmp_path / "src", destination, "yaml2xml")
+    assert (tmp_path / "src" / "a.xml").read_text() == '<View><Header value="a"/></View>'
+    assert convert_directory(tmp_path / "src", tmp_path / "back", "yaml2xml", workers=1).items == 1
+    assert (tmp_path / "back" / "a.xml").exists()
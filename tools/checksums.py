@@ -0,0 +1,335 @@
+"""
+Checksum engine for bags: hashes files in a process pool, all algorithms in one read pass
+(buffered reads into a reused buffer, or mmap), and reads/writes bagit manifests and tag files.
+
+Used by local_bags, SmartPath.create_bag, MBag and gen/bagit_map for bag creation and validation.
+
+Example:
+    ```python
+    from tools.checksums import make_bag, validate_bag
+
+    bag = make_bag(folder, {"Source-Organization": "..."}, processes=4)
+    result = validate_bag(folder, fast=False)
+    print(result.summary("files"), "valid:", not result.errors)
+    ```
+"""
+import hashlib
+import mmap
+import multiprocessing
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Optional, Iterable, Union, TYPE_CHECKING
+
+from tools.throughput import Throughput
+
+if TYPE_CHECKING:
+    import bagit
+
+DEFAULT_ALGORITHMS = ["sha256", "sha512"]
+HASH_BUFFER_SIZE = 8 * 1024 * 1024
+# below this payload size starting worker processes takes longer than hashing in this process
+POOL_MIN_BYTES = 64 * 1024 * 1024
+BAG_SOFTWARE_AGENT = "python-project-tools"
+_NEWLINES = re.compile(r"[\r\n]")
+BAGIT_TXT = "BagIt-Version: 0.97\nTag-File-Character-Encoding: UTF-8\n"
+
+
+def hash_file(path: Union[str, Path],
+              algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+              buffer_size: int = HASH_BUFFER_SIZE,
+              use_mmap: bool = False) -> dict[str, str]:
+    """hexdigests of all algorithms, computed in a single read of the file"""
+    hashers = {alg: hashlib.new(alg) for alg in algorithms}
+    with open(path, "rb", buffering=0) as f:
+        if use_mmap:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    for hasher in hashers.values():
+                        hasher.update(mapped)
+        else:
+            buffer = bytearray(buffer_size)
+            view = memoryview(buffer)
+            while size := f.readinto(buffer):
+                for hasher in hashers.values():
+                    hasher.update(view[:size])
+    return {alg: hasher.hexdigest() for alg, hasher in hashers.items()}
+
+
+def _hash_job(job: tuple[Path, list[str], int, bool]) -> tuple[Path, dict[str, str], int]:
+    path, algorithms, buffer_size, use_mmap = job
+    return path, hash_file(path, algorithms, buffer_size, use_mmap), path.stat().st_size
+
+
+def _pool_context() -> Optional[multiprocessing.context.BaseContext]:
+    # forking a process with other threads running (BagReceiver, transfers, native libraries)
+    # can deadlock the child. the default from python 3.14 on
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return None
+
+
+def _total_size(jobs: list[tuple[Path, list[str], int, bool]], limit: int) -> int:
+    """size of the files of jobs, counted up to limit"""
+    total = 0
+    for path, *_ in jobs:
+        if total >= limit:
+            break
+        total += path.stat().st_size
+    return total
+
+
+def hash_files(paths: Iterable[Path],
+               algorithms: Iterable[str] = DEFAULT_ALGORITHMS,
+               processes: Optional[int] = None,
+               buffer_size: int = HASH_BUFFER_SIZE,
+               use_mmap: bool = False,
+               pool_min_bytes: int = POOL_MIN_BYTES) -> tuple[dict[Path, dict[str, str]], Throughput]:
+    """
+    Hash files across a process pool (processes=None: cpu count, 1: in this process).
+    Fewer than pool_min_bytes in total are hashed in this process.
+
+    :return: hashes per path and the throughput (items: files, bytes: bytes read)
+    """
+    jobs = [(Path(path), list(algorithms), buffer_size, use_mmap) for path in paths]
+    throughput = Throughput()
+    results: dict[Path, dict[str, str]] = {}
+    use_pool = processes != 1 and len(jobs) > 1 and _total_size(jobs, pool_min_bytes) >= pool_min_bytes
+    pool = ProcessPoolExecutor(processes, mp_context=_pool_context()) if use_pool else None
+    try:
+        if pool:
+            chunksize = max(1, len(jobs) // ((processes or os.cpu_count() or 1) * 8))
+            hashed = pool.map(_hash_job, jobs, chunksize=chunksize)
+        else:
+            hashed = map(_hash_job, jobs)
+        for path, hashes, size in hashed:
+            results[path] = hashes
+            throughput.add(1, size)
+    finally:
+        if pool:
+            pool.shutdown()
+    return results, throughput.stop()
+
+
+"""
+bagit files
+"""
+
+
+def payload_files(bag_dir: Path) -> list[Path]:
+    return sorted(p for p in (Path(bag_dir) / "data").rglob("*") if p.is_file())
+
+
+def _encode_filename(name: str) -> str:
+    return name.replace("\r", "%0D").replace("\n", "%0A")
+
+
+def _decode_filename(name: str) -> str:
+    return re.sub("%0A", "\n", re.sub("%0D", "\r", name, flags=re.IGNORECASE), flags=re.IGNORECASE)
+
+
+def manifest_algorithms(bag_dir: Path, tag: bool = False) -> list[str]:
+    prefix = "tagmanifest-" if tag else "manifest-"
+    return sorted(p.stem.removeprefix(prefix) for p in Path(bag_dir).glob(f"{prefix}*.txt"))
+
+
+def parse_manifest(text: str) -> dict[str, str]:
+    """path -> hash of a manifest's content"""
+    entries = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        digest, path = line.split(None, 1)
+        entries[_decode_filename(path.lstrip("*"))] = digest
+    return entries
+
+
+def read_manifest(bag_dir: Path, algorithm: str, tag: bool = False) -> dict[str, str]:
+    """path (relative to the bag, posix) -> hash"""
+    manifest = Path(bag_dir) / f"{'tagmanifest' if tag else 'manifest'}-{algorithm}.txt"
+    return parse_manifest(manifest.read_text(encoding="utf-8-sig"))
+
+
+def manifest_text(entries: dict[str, dict[str, str]], algorithm: str) -> str:
+    """
+    :param entries: payload path (relative to the bag, posix) -> hash per algorithm
+    """
+    return "".join(f"{hashes[algorithm]}  {_encode_filename(path)}\n" for path, hashes in sorted(entries.items()))
+
+
+def write_manifests(bag_dir: Path, entries: dict[str, dict[str, str]], algorithms: Iterable[str],
+                    encoding: str = "utf-8") -> None:
+    bag_dir = Path(bag_dir)
+    for alg in algorithms:
+        (bag_dir / f"manifest-{alg}.txt").write_text(manifest_text(entries, alg), encoding=encoding)
+
+
+def read_tag_file(path: Path) -> dict[str, Union[str, list[str]]]:
+    tags: dict[str, Union[str, list[str]]] = {}
+    for line in path.read_text(encoding="utf-8-sig").splitlines():
+        if ":" not in line or line[:1].isspace():
+            continue
+        name, value = (part.strip() for part in line.split(":", 1))
+        if name in tags:
+            previous = tags[name]
+            tags[name] = (previous if isinstance(previous, list) else [previous]) + [value]
+        else:
+            tags[name] = value
+    return tags
+
+
+def tag_file_text(tags: dict) -> str:
+    lines = []
+    for name in sorted(tags):
+        values = tags[name] if isinstance(tags[name], list) else [tags[name]]
+        lines.extend(f"{name}: {_NEWLINES.sub('', str(value))}\n" for value in values)
+    return "".join(lines)
+
+
+def write_tag_file(path: Path, tags: dict) -> None:
+    path.write_text(tag_file_text(tags), encoding="utf-8")
+
+
+def bag_info(info: Optional[dict], octets: int, streams: int) -> dict:
+    """bag-info tags with defaults for the date and agent and the Payload-Oxum"""
+    info = dict(info or {})
+    info.setdefault("Bagging-Date", date.today().isoformat())
+    info.setdefault("Bag-Software-Agent", BAG_SOFTWARE_AGENT)
+    info["Payload-Oxum"] = f"{octets}.{streams}"
+    return info
+
+
+def tagmanifest_text(tag_file_hashes: dict[str, dict[str, str]], algorithm: str) -> str:
+    """:param tag_file_hashes: tag file path (relative to the bag) -> hash per algorithm"""
+    return "".join(f"{hashes[algorithm]} {name}\n" for name, hashes in sorted(tag_file_hashes.items()))
+
+
+def write_tagmanifests(bag_dir: Path, algorithms: Iterable[str], encoding: str = "utf-8") -> None:
+    # plain Path, SmartPath creates missing directories for every derived path
+    bag_dir = Path(bag_dir)
+    tag_files = sorted(p.relative_to(bag_dir).as_posix() for p in bag_dir.rglob("*")
+                       if p.is_file() and not p.relative_to(bag_dir).as_posix().startswith("data/")
+                       and not re.match(r"^tagmanifest-.+\.txt$", p.name))
+    algorithms = list(algorithms)
+    hashes = {name: hash_file(bag_dir / name, algorithms) for name in tag_files}
+    for alg in algorithms:
+        (bag_dir / f"tagmanifest-{alg}.txt").write_text(tagmanifest_text(hashes, alg), encoding=encoding)
+
+
+def make_bag(bag_dir: Union[str, Path],
+             info: Optional[dict] = None,
+             algorithms: Optional[list[str]] = None,
+             processes: Optional[int] = None) -> "bagit.Bag":
+    """
+    Turn a directory into a bag in place (like bagit.make_bag), hashing the payload with this engine.
+    """
+    import bagit
+
+    bag_dir = Path(bag_dir).absolute()
+    algorithms = algorithms or DEFAULT_ALGORITHMS
+    temp_data = Path(tempfile.mkdtemp(dir=bag_dir))
+    for entry in list(bag_dir.iterdir()):
+        if entry != temp_data:
+            os.rename(entry, temp_data / entry.name)
+    os.rename(temp_data, bag_dir / "data")
+
+    hashes, throughput = hash_files(payload_files(bag_dir), algorithms, processes)
+    write_manifests(bag_dir, {path.relative_to(bag_dir).as_posix(): h for path, h in hashes.items()}, algorithms)
+    (bag_dir / "bagit.txt").write_text(BAGIT_TXT, encoding="utf-8")
+    write_tag_file(bag_dir / "bag-info.txt", bag_info(info, throughput.bytes, throughput.items))
+    write_tagmanifests(bag_dir, algorithms)
+    return bagit.Bag(str(bag_dir))
+
+
+def validate_bag(bag_dir: Union[str, Path],
+                 fast: bool = False,
+                 processes: Optional[int] = None) -> Throughput:
+    """
+    Validate a bag. fast only compares the Payload-Oxum (byte and file count) with the payload,
+    full validation also checks completeness and re-hashes all payload files (all manifests in one read)
+    and the tag files listed in the tag manifests, like bagit.Bag.validate.
+    The bag is valid if the result has no errors.
+    """
+    bag_dir = Path(bag_dir)
+    throughput = Throughput()
+    payload = payload_files(bag_dir)
+    oxum = read_tag_file(bag_dir / "bag-info.txt").get("Payload-Oxum")
+    if oxum:
+        octets, streams = (int(part) for part in oxum.split("."))
+        actual_octets = sum(p.stat().st_size for p in payload)
+        if (octets, streams) != (actual_octets, len(payload)):
+            throughput.errors.append(f"Payload-Oxum {oxum} does not match the payload {actual_octets}.{len(payload)}")
+    elif fast:
+        throughput.errors.append("fast validation requires a Payload-Oxum")
+    if fast:
+        return throughput.stop()
+
+    algorithms = manifest_algorithms(bag_dir)
+    manifests = {alg: read_manifest(bag_dir, alg) for alg in algorithms}
+    expected = set().union(*manifests.values()) if manifests else set()
+    actual = {p.relative_to(bag_dir).as_posix() for p in payload}
+    throughput.errors.extend(f"{path} missing" for path in sorted(expected - actual))
+    throughput.errors.extend(f"{path} not in manifest" for path in sorted(actual - expected))
+
+    hashes, hashed = hash_files([bag_dir / path for path in sorted(actual & expected)], algorithms, processes)
+    for path, file_hashes in hashes.items():
+        rel = path.relative_to(bag_dir).as_posix()
+        for alg, digest in file_hashes.items():
+            if manifests[alg].get(rel) not in (None, digest):
+                throughput.errors.append(f"{rel} {alg} checksum mismatch")
+    throughput.add(hashed.items, hashed.bytes)
+    _validate_tag_files(bag_dir, throughput)
+    return throughput.stop()
+
+
+def _validate_tag_files(bag_dir: Path, throughput: Throughput) -> None:
+    """tag files in the tag manifests exist and match their hashes (few small files, hashed in this process)"""
+    algorithms = manifest_algorithms(bag_dir, tag=True)
+    manifests = {alg: read_manifest(bag_dir, alg, tag=True) for alg in algorithms}
+    for rel in sorted(set().union(*manifests.values()) if manifests else ()):
+        path = bag_dir / rel
+        if not path.is_file():
+            throughput.errors.append(f"{rel} missing")
+            continue
+        hashes = hash_file(path, [alg for alg in algorithms if rel in manifests[alg]])
+        throughput.add(1, path.stat().st_size)
+        throughput.errors.extend(f"{rel} {alg} checksum mismatch"
+                                 for alg, digest in hashes.items() if manifests[alg][rel] != digest)
+
+
+def is_valid_bag(bag_dir: Union[str, Path], fast: bool = False, processes: Optional[int] = None) -> bool:
+    return not validate_bag(bag_dir, fast, processes).errors
+
+
+if __name__ == "__main__":
+    import shutil
+    import sys
+    import time
+
+    import bagit
+
+    source = Path(tempfile.mkdtemp())
+    # 64 files of 16MB
+    for i in range(64):
+        (source / f"file_{i}.bin").write_bytes(os.urandom(16 * 1024 * 1024))
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    try:
+        for name, create in [("bagit.make_bag", lambda d: bagit.make_bag(str(d), {}, processes=processes or 1)),
+                             ("checksums.make_bag", lambda d: make_bag(d, {}, processes=processes))]:
+            bag_dir = source.with_name(source.name + "_bag")
+            shutil.copytree(source, bag_dir)
+            start = time.perf_counter()
+            create(bag_dir)
+            print(f"{name}: {time.perf_counter() - start:.2f}s")
+            start = time.perf_counter()
+            bagit.Bag(str(bag_dir)).validate(processes=processes or 1)
+            print(f"  bagit validate: {time.perf_counter() - start:.2f}s")
+            print(f"  validate_bag: {validate_bag(bag_dir, processes=processes).summary('files')}")
+            print(f"  validate_bag fast: {validate_bag(bag_dir, fast=True).seconds:.4f}s")
+            shutil.rmtree(bag_dir)
+    finally:
+        shutil.rmtree(source)
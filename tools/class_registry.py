@@ -1,17 +1,131 @@
+import ast
+import os
 import sys
 import inspect
+import hashlib
 import importlib.util
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from importlib.machinery import ModuleSpec
 from pathlib import Path
+from types import CodeType
 from typing import Dict, Type, TypeVar, Optional
 
+import orjson
+
+from tools.instrumentation import instrument
+
 T = TypeVar('T')
 
+CACHE_DIR_NAME = "python-project-tools"
+
+
+def scan_registrations(path: Path) -> list[str]:
+    """Names registered in a module file, found via decorators like @<registry>.register("name")"""
+    tree = ast.parse(path.read_bytes(), filename=str(path))
+    names = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+            continue
+        for dec in node.decorator_list:
+            if not (isinstance(dec, ast.Call) and isinstance(dec.func, ast.Attribute) and dec.func.attr == "register"):
+                continue
+            args = dec.args or [kw.value for kw in dec.keywords if kw.arg == "name"]
+            if args and isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
+                names.append(args[0].value)
+    return names
+
+
+def manifest_path(folder: Path) -> Path:
+    """index of the registrations of folder, in the user cache dir ($XDG_CACHE_HOME or ~/.cache)"""
+    cache_dir = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / CACHE_DIR_NAME / "registry"
+    folder = folder.absolute()
+    return cache_dir / f"{folder.name}-{hashlib.sha1(str(folder).encode()).hexdigest()[:16]}.json"
+
+
+def build_manifest(folder: Path) -> Dict[str, Path]:
+    """
+    Map registry names to the module files of folder.
+    Files are only parsed when their mtime differs from the index in the cache dir (see manifest_path),
+    the plugin folder itself is not written to.
+    """
+    index_path = manifest_path(folder)
+    try:
+        index = orjson.loads(index_path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        index = {}
+
+    new_index = {}
+    manifest: Dict[str, Path] = {}
+    for py_file in sorted(folder.glob("*.py")):
+        if py_file.name.startswith("__"):
+            continue
+        mtime_ns = py_file.stat().st_mtime_ns
+        entry = index.get(py_file.name)
+        if not entry or entry["mtime_ns"] != mtime_ns:
+            entry = {"mtime_ns": mtime_ns, "names": scan_registrations(py_file)}
+        new_index[py_file.name] = entry
+        for name in entry["names"]:
+            manifest[name] = py_file
+
+    if new_index != index:
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            index_path.write_bytes(orjson.dumps(new_index, option=orjson.OPT_INDENT_2))
+        except OSError:
+            pass  # no writable cache dir, scan again next time
+    return manifest
+
+
+@contextmanager
+def _on_sys_path(folder: Path):
+    folder_str = folder.as_posix()
+    if folder_str in sys.path:
+        yield
+        return
+    sys.path.insert(0, folder_str)
+    try:
+        yield
+    finally:
+        sys.path.remove(folder_str)
+
+
+@dataclass
+class ModuleLoadStats:
+    module: str
+    path: Path
+    # reading source/bytecode and compiling
+    compile_seconds: float
+    # executing the module body
+    exec_seconds: float
+    # memory allocated by the module body and still in use afterwards (only with trace_memory)
+    memory_bytes: Optional[int] = None
+    registered: list[str] = field(default_factory=list)
+
+    @property
+    def total_seconds(self) -> float:
+        return self.compile_seconds + self.exec_seconds
+
+
+def _module_name(path: Path) -> str:
+    """
+    Flat, unique module name of a plugin file: a dotted name would need a parent package in sys.modules
+    (pickling registered classes looks the module up by this name)
+    """
+    return f"_registry_{hashlib.sha1(str(path.absolute()).encode()).hexdigest()[:8]}_{path.stem}"
+
 
 class Registry:
     """Registry that works relative to where it's instantiated"""
 
     def __init__(self, base_path: Optional[str] = None):
         self._classes: Dict[str, Type] = {}
+        # registered names of modules that are not imported yet
+        self._manifest: Dict[str, Path] = {}
+        self._load_stats: list[ModuleLoadStats] = []
 
         # If no base_path provided, use the caller's location
         if base_path is None:
@@ -34,35 +148,114 @@ class Registry:
 
         return decorator
 
+    def _compile(self, path: Path) -> tuple[Optional[ModuleSpec], Optional[CodeType], float]:
+        """Read and compile a module (uses the __pycache__ bytecode when it is up to date)"""
+        start = time.perf_counter()
+        spec = importlib.util.spec_from_file_location(_module_name(path), path)
+        if not (spec and spec.loader):
+            return None, None, 0.0
+        code = spec.loader.get_code(spec.name)
+        return spec, code, time.perf_counter() - start
+
+    def _execute(self, spec: ModuleSpec, code: CodeType, compile_seconds: float):
+        if spec.name in sys.modules:
+            return sys.modules[spec.name]
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        before = set(self._classes)
+        tracing = tracemalloc.is_tracing()
+        memory_before = tracemalloc.get_traced_memory()[0] if tracing else 0
+        start = time.perf_counter()
+        try:
+            exec(code, module.__dict__)
+        except BaseException:
+            del sys.modules[spec.name]
+            # names registered before the failure belong to a module that does not exist
+            for name in set(self._classes) - before:
+                del self._classes[name]
+            raise
+        self._load_stats.append(ModuleLoadStats(
+            module=spec.name,
+            path=Path(spec.origin),
+            compile_seconds=compile_seconds,
+            exec_seconds=time.perf_counter() - start,
+            memory_bytes=tracemalloc.get_traced_memory()[0] - memory_before if tracing else None,
+            registered=[name for name in self._classes if name not in before]))
+        return module
+
     def load_from_path(self, path: Path):
-        """Load module from file path - triggers decorator registration"""
+        """
+        Load module from file path - triggers decorator registration.
+        Modules are cached in sys.modules and not executed again.
+        """
         if not path.is_absolute():
-            _path = self.base_path / path
+            path = self.base_path / path
 
-        sys.path.insert(0, path.parent.as_posix())
-        try:
-            spec = importlib.util.spec_from_file_location(path.stem, path)
-            if spec and spec.loader:
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-                return module
-        finally:
-            sys.path.pop(0)
+        module_name = _module_name(path)
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+
+        with _on_sys_path(path.parent):
+            spec, code, compile_seconds = self._compile(path)
+            if spec:
+                return self._execute(spec, code, compile_seconds)
 
-    def load_instances(self, folder: str = "instances"):
-        """Load all modules from instances folder relative to base_path"""
+    @instrument("Registry.load_instances")
+    def load_instances(self,
+                       folder: str = "instances",
+                       lazy: bool = False,
+                       parallel: bool = False,
+                       max_workers: Optional[int] = None,
+                       trace_memory: bool = False):
+        """
+        Load all modules from instances folder relative to base_path.
+        With lazy, only the manifest (name -> file) is built and a module is imported
+        on the first get/create of one of its names.
+        With parallel, the modules are read and compiled in a thread pool; the module bodies
+        are executed in order afterwards, so registration is unchanged.
+        Timings (and with trace_memory, memory) per module are available through load_stats().
+        """
         instances_path = self.base_path / folder
 
         if not instances_path.exists():
             print(f"No {folder} folder found at {instances_path}")
             return
 
-        for py_file in instances_path.glob("*.py"):
-            if py_file.name.startswith("__"):
-                continue
-            self.load_from_path(py_file)
+        if lazy:
+            manifest = build_manifest(instances_path)
+            self._manifest.update({name: path for name, path in manifest.items() if name not in self._classes})
+            return
+
+        py_files = [py_file for py_file in sorted(instances_path.glob("*.py"))
+                    if not py_file.name.startswith("__") and _module_name(py_file) not in sys.modules]
+        start_tracing = trace_memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        try:
+            with _on_sys_path(instances_path):
+                if parallel:
+                    with ThreadPoolExecutor(max_workers) as pool:
+                        compiled = list(pool.map(self._compile, py_files))
+                    for spec, code, compile_seconds in compiled:
+                        if spec:
+                            self._execute(spec, code, compile_seconds)
+                else:
+                    for py_file in py_files:
+                        self.load_from_path(py_file)
+        finally:
+            if start_tracing:
+                tracemalloc.stop()
+        self._manifest = {name: path for name, path in self._manifest.items() if path.parent != instances_path}
+
+    def load_stats(self) -> list[ModuleLoadStats]:
+        """Load statistics of all modules loaded by this registry, slowest first"""
+        return sorted(self._load_stats, key=lambda stats: stats.total_seconds, reverse=True)
 
     def get(self, name: str) -> Optional[Type]:
+        if name not in self._classes and name in self._manifest:
+            # the entry stays when the import fails, the next get raises again instead of returning None
+            self.load_from_path(self._manifest[name])
+            del self._manifest[name]
         return self._classes.get(name)
 
     def create(self, name: str, *args, **kwargs):
@@ -70,4 +263,4 @@ class Registry:
         return class_obj(*args, **kwargs) if class_obj else None
 
     def list_all(self) -> list[str]:
-        return list(self._classes.keys())
\ No newline at end of file
+        return list(dict.fromkeys([*self._classes, *self._manifest]))
@@ -1,7 +0,0 @@
-
-
-"""
-a decorator that reads the type hint and creates a log of changes in the data.
-between two different functions you can run a deepdiff on each other or a base.
-automatically finds the right folder appdir, module of function,
-"""
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""
+Persistent SQLite index of the files in the data folder.
+
+The catalog stores path, size, mtime and content hash of every file below
+`base_data_folder()` together with the json-ld metadata of the top-level data folders
+(`data/<name>.json`, see `get_data_folders`).
+`refresh` updates the index incrementally: only files whose size or mtime changed are re-hashed.
+Queries are answered from the index; `latest` re-lists a folder only when the folder mtime changed
+(files added, removed or renamed), files rewritten in place are picked up by the next `refresh`.
+One connection is shared by the threads of a process, guarded by a lock.
+
+Example:
+    ```python
+    from tools.data_catalog import catalog
+
+    catalog().refresh()
+    csvs = catalog().find(suffix=".csv", min_size=1024)
+    latest = catalog().latest(catalog().root / "raw")
+    ```
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Union, NamedTuple, Any
+
+import orjson
+
+from tools.data_folder import base_data_folder
+
+CATALOG_FILENAME = ".catalog.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    suffix TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_files_parent_suffix_mtime ON files (parent, suffix, mtime_ns);
+CREATE INDEX IF NOT EXISTS ix_files_parent_mtime ON files (parent, mtime_ns);
+CREATE INDEX IF NOT EXISTS ix_files_name ON files (name);
+CREATE INDEX IF NOT EXISTS ix_files_suffix ON files (suffix);
+CREATE INDEX IF NOT EXISTS ix_files_size ON files (size);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS folders (
+    name TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    metadata TEXT
+);
+"""
+
+
+class CatalogEntry(NamedTuple):
+    path: Path
+    size: int
+    mtime: float
+    hash: Optional[str]
+    metadata: Optional[dict]
+
+
+def file_hash(path: Path, algorithm: str = "sha256") -> str:
+    with path.open("rb") as f:
+        return hashlib.file_digest(f, algorithm).hexdigest()
+
+
+def _prefix_range(rel: str) -> tuple[str, str]:
+    # all paths below rel: rel + "/" <= path < rel + "0" ("0" follows "/" in ascii)
+    return f"{rel}/", f"{rel}0"
+
+
+class DataCatalog:
+    """
+    SQLite index over a folder (by default the project data folder).
+
+    @param root: folder that is indexed
+    @param db_path: location of the sqlite file. default: root/.catalog.sqlite
+    @param hash_files: compute a sha256 hash for each (changed) file
+    """
+
+    def __init__(self, root: Union[str, Path], db_path: Optional[Path] = None, hash_files: bool = True):
+        self.root = Path(root).absolute()
+        self.db_path = Path(db_path) if db_path else self.root / CATALOG_FILENAME
+        self.hash_files = hash_files
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql: str, params: Union[tuple, list] = ()) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _rel(self, path: Union[str, Path]) -> str:
+        path = Path(path)
+        if not path.is_absolute():
+            path = self.root / path
+        rel = path.absolute().relative_to(self.root).as_posix()
+        return "" if rel == "." else rel
+
+    def _skip(self, name: str) -> bool:
+        return name.startswith(self.db_path.name)
+
+    def refresh(self, folder: Optional[Union[str, Path]] = None, recursive: bool = True,
+                hash_files: Optional[bool] = None) -> dict[str, int]:
+        """
+        Bring the index up to date for the root or a sub folder.
+        Files are only re-hashed when size or mtime differ from the index (or they were indexed without hash).
+
+        @param hash_files: overrides hash_files of the catalog, files indexed without hash get it in a later refresh
+        @return: counts of added, updated, removed and unchanged files
+        """
+        hashing = self.hash_files if hash_files is None else hash_files
+        rel_base = self._rel(folder) if folder else ""
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+        columns = "SELECT path, size, mtime_ns, hash IS NOT NULL FROM files"
+        if not recursive:
+            known_rows = self._query(f"{columns} WHERE parent = ?", (rel_base,))
+        elif rel_base:
+            known_rows = self._query(f"{columns} WHERE path >= ? AND path < ?", _prefix_range(rel_base))
+        else:
+            known_rows = self._query(columns)
+        known = {p: (size, mtime_ns, hashed) for p, size, mtime_ns, hashed in known_rows}
+
+        upserts: list[tuple] = []
+        dirs: list[tuple[str, int]] = []
+        stack = [(self.root / rel_base) if rel_base else self.root]
+        while stack:
+            current = stack.pop()
+            try:
+                dirs.append((self._rel(current), current.stat().st_mtime_ns))
+                entries = list(os.scandir(current))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        stack.append(Path(entry.path))
+                    continue
+                if not entry.is_file() or self._skip(entry.name):
+                    continue
+                stat = entry.stat()
+                rel = self._rel(entry.path)
+                previous = known.pop(rel, None)
+                if previous and previous[:2] == (stat.st_size, stat.st_mtime_ns) and (previous[2] or not hashing):
+                    counts["unchanged"] += 1
+                    continue
+                counts["added" if previous is None else "updated"] += 1
+                parent, _, name = rel.rpartition("/")
+                upserts.append((rel, parent, rel.split("/", 1)[0] if parent else "", name,
+                                Path(name).suffix, stat.st_size, stat.st_mtime_ns,
+                                file_hash(Path(entry.path)) if hashing else None))
+
+        counts["removed"] = len(known)
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", ((p,) for p in known))
+            self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)", upserts)
+            self._conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?)", dirs)
+        self._refresh_folder_metadata()
+        return counts
+
+    def _refresh_folder_metadata(self) -> None:
+        """json-ld metadata of top-level folders: data/<name>.json"""
+        known = dict(self._query("SELECT name, mtime_ns FROM folders"))
+        current: dict[str, tuple[int, Path]] = {}
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.name.endswith(".json") and (self.root / entry.name[:-5]).is_dir():
+                current[entry.name[:-5]] = (entry.stat().st_mtime_ns, Path(entry.path))
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM folders WHERE name = ?", ((n,) for n in known if n not in current))
+            for name, (mtime_ns, path) in current.items():
+                if known.get(name) != mtime_ns:
+                    self._conn.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)",
+                                       (name, mtime_ns, path.read_text(encoding="utf-8")))
+
+    def _entry(self, row: tuple) -> CatalogEntry:
+        path, size, mtime_ns, hash_, metadata = row
+        return CatalogEntry(self.root / path, size, mtime_ns / 1e9, hash_,
+                            orjson.loads(metadata) if metadata else None)
+
+    def find(self,
+             name: Optional[str] = None,
+             suffix: Optional[str] = None,
+             folder: Optional[Union[str, Path]] = None,
+             min_size: Optional[int] = None,
+             max_size: Optional[int] = None,
+             metadata: Optional[dict[str, Any]] = None,
+             limit: Optional[int] = None) -> list[CatalogEntry]:
+        """
+        Query the index. All given filters must match.
+
+        @param name: filename or glob pattern (e.g. "*_2024*")
+        @param suffix: file suffix including the dot, e.g. ".csv"
+        @param folder: only files below this folder
+        @param metadata: key/values that the json-ld metadata of the top-level data folder must contain
+        """
+        clauses, params = [], []
+        if name is not None:
+            clauses.append("f.name GLOB ?")
+            params.append(name)
+        if suffix is not None:
+            clauses.append("f.suffix = ?")
+            params.append(suffix)
+        if folder is not None:
+            rel = self._rel(folder)
+            if rel:
+                clauses.append("f.path >= ? AND f.path < ?")
+                params.extend(_prefix_range(rel))
+        if min_size is not None:
+            clauses.append("f.size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            clauses.append("f.size <= ?")
+            params.append(max_size)
+        for key, value in (metadata or {}).items():
+            clauses.append("json_extract(m.metadata, ?) = ?")
+            params.extend([f'$."{key}"', value])
+        sql = ("SELECT f.path, f.size, f.mtime_ns, f.hash, m.metadata FROM files f "
+               "LEFT JOIN folders m ON m.name = f.folder")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY f.path"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [self._entry(row) for row in self._query(sql, params)]
+
+    def latest(self, folder: Union[str, Path], suffix: Optional[str] = None) -> Optional[Path]:
+        """
+        Most recently modified file directly in folder, an index lookup.
+        The folder is only re-listed (without hashing) when its mtime differs from the index, i.e. files
+        were added, removed or renamed. Files rewritten in place are picked up by the next refresh.
+        """
+        rel = self._rel(folder)
+        indexed = self._query("SELECT mtime_ns FROM dirs WHERE path = ?", (rel,))
+        try:
+            changed = not indexed or indexed[0][0] != (self.root / rel).stat().st_mtime_ns
+        except FileNotFoundError:
+            changed = True
+        if changed:
+            self.refresh(rel or None, recursive=False, hash_files=False)
+        if suffix is None:
+            rows = self._query("SELECT path FROM files WHERE parent = ? ORDER BY mtime_ns DESC LIMIT 1", (rel,))
+        else:
+            rows = self._query("SELECT path FROM files WHERE parent = ? AND suffix = ? ORDER BY mtime_ns DESC LIMIT 1",
+                               (rel, suffix))
+        return self.root / rows[0][0] if rows else None
+
+
+@lru_cache
+def catalog() -> DataCatalog:
+    return DataCatalog(base_data_folder())
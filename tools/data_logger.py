@@ -0,0 +1,361 @@
+"""
+a decorator that reads the type hint and creates a log of changes in the data.
+between two different functions you can run a deepdiff on each other or a base.
+automatically finds the right folder appdir, module of function,
+
+Snapshots of the type-hinted parameters and the return value of sampled calls are stored
+content addressed (sha256 of canonical json, zlib compressed) in data/data_log/blobs, so identical
+data is stored once. Each function has a calls.jsonl in data/data_log/<module>/<function>
+with the snapshot hashes per call. Diffs are only computed when asked for (DataLog.diff).
+
+In the call only the sampled snapshots are serialized, hashing, compression and writing happen in a
+background thread (bounded queue, snapshots are dropped when it is full).
+Logging never changes the outcome of a call: values that can't be serialized are skipped (counted
+in skipped_snapshots) and the function runs and returns as without the decorator.
+DATA_LOG=0 in the environment disables all logging.
+
+Example:
+    ```python
+    @data_log(sample_rate=0.05)
+    def clean(records: list[dict], config: Config) -> list[dict]:
+        ...
+
+    log = DataLog(clean)
+    calls = log.calls()
+    log.diff(calls[-2], calls[-1], "output")
+    ```
+"""
+import atexit
+import functools
+import hashlib
+import inspect
+import os
+import queue
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path, PurePath
+from typing import Optional, Callable, Any, Union, NamedTuple, get_type_hints
+
+import orjson
+
+DATA_LOG_ENV = "DATA_LOG"
+_DUMP_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    if isinstance(value, PurePath):
+        return value.as_posix()
+    if hasattr(value, "__dict__"):
+        # attributes, not repr: a repr with a memory address would make every snapshot distinct
+        return {"__type__": f"{type(value).__module__}.{type(value).__qualname__}", **vars(value)}
+    raise TypeError(f"Type is not serializable: {type(value).__qualname__}")
+
+
+def snapshot_bytes(value: Any) -> bytes:
+    """canonical json (sorted keys) of a value, pydantic models by model_dump. raises TypeError"""
+    return orjson.dumps(value, default=_default, option=_DUMP_OPTIONS)
+
+
+@functools.lru_cache
+def logger():
+    from tools import project_logging
+    return project_logging.get_logger(__name__)
+
+
+def default_log_folder() -> Path:
+    from tools.data_folder import base_data_folder
+    return Path(base_data_folder()) / "data_log"
+
+
+class SnapshotStore:
+    """content addressed snapshots: <root>/blobs/<hash[:2]>/<hash>.json.z"""
+
+    def __init__(self, root: Path, cache_size: int = 256):
+        self.root = Path(root)
+        # decompressed content of recently read snapshots, get parses a new object each time
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / f"{digest}.json.z"
+
+    def put(self, content: bytes) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(zlib.compress(content, 1))
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> Any:
+        """the snapshot as a new object, callers can modify it"""
+        with self._lock:
+            content = self._cache.get(digest)
+            if content is not None:
+                self._cache.move_to_end(digest)
+        if content is None:
+            content = zlib.decompress(self._path(digest).read_bytes())
+            with self._lock:
+                self._cache[digest] = content
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return orjson.loads(content)
+
+
+class _Writer:
+    """background thread: hash, compress and store snapshots, append call records"""
+
+    def __init__(self, max_queue: int = 1000):
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.dropped = 0
+        # snapshots that could not be serialized
+        self.skipped = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, store: SnapshotStore, calls_file: Path, record: dict, snapshots: dict[str, bytes]) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="data-logger", daemon=True)
+                self._thread.start()
+        try:
+            self.queue.put_nowait((store, calls_file, record, snapshots))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            store, calls_file, record, snapshots = self.queue.get()
+            try:
+                hashes = {name: store.put(content) for name, content in snapshots.items()}
+                record["output"] = hashes.pop("return", None)
+                record["inputs"] = hashes
+                calls_file.parent.mkdir(parents=True, exist_ok=True)
+                with calls_file.open("ab") as f:
+                    f.write(orjson.dumps(record) + b"\n")
+            except Exception as e:
+                logger().error(f"data logger failed to write {calls_file}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self) -> None:
+        if self._thread is not None:
+            self.queue.join()
+
+
+_writer = _Writer()
+atexit.register(_writer.flush)
+
+
+def flush() -> None:
+    """wait until all queued snapshots are written"""
+    _writer.flush()
+
+
+def skipped_snapshots() -> int:
+    """number of snapshots skipped because the value could not be serialized"""
+    return _writer.skipped
+
+
+def _function_folder(func: Callable, base: Optional[Path]) -> Path:
+    return (base or default_log_folder()) / func.__module__ / func.__qualname__.replace("<locals>.", "")
+
+
+def data_log(func: Optional[Callable] = None, *,
+             sample_rate: float = 1.0,
+             max_per_second: Optional[float] = None,
+             folder: Optional[Path] = None,
+             inputs: bool = True,
+             output: bool = True) -> Callable:
+    """
+    Log snapshots of the type-hinted parameters and (with a return type hint) the return value.
+
+    :param sample_rate: fraction of calls that are logged
+    :param max_per_second: upper bound of logged calls per second (on top of sample_rate)
+    :param folder: base folder, the function gets a sub folder <module>/<function>. default data/data_log
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+        state: dict[str, Any] = {"window": 0, "count": 0, "warned": False}
+        state_lock = threading.Lock()
+
+        @functools.lru_cache(maxsize=1)
+        def setup() -> tuple[SnapshotStore, Path, list[str], bool]:
+            # type hints are resolved at the first logged call (forward references)
+            hints = get_type_hints(fn)
+            params = [name for name in signature.parameters if name in hints and name not in ("self", "cls")]
+            log_output = output and hints.get("return", None) not in (None, type(None))
+            base = folder or default_log_folder()
+            return SnapshotStore(base), _function_folder(fn, base) / "calls.jsonl", params, log_output
+
+        def sampled() -> bool:
+            if os.environ.get(DATA_LOG_ENV, "1") == "0" or random.random() >= sample_rate:
+                return False
+            if max_per_second:
+                window = int(time.monotonic())
+                with state_lock:
+                    if window != state["window"]:
+                        state["window"], state["count"] = window, 0
+                    state["count"] += 1
+                    return state["count"] <= max_per_second
+            return True
+
+        def snapshot(name: str, value: Any, snapshots: dict[str, bytes], record: dict) -> None:
+            try:
+                snapshots[name] = snapshot_bytes(value)
+            except (TypeError, ValueError) as e:
+                with _writer._lock:
+                    _writer.skipped += 1
+                record.setdefault("skipped", []).append(name)
+                with state_lock:
+                    warn, state["warned"] = not state["warned"], True
+                if warn:
+                    logger().warning(f"data log of {fn.__qualname__}: {name} not serializable ({e}), skipped")
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not sampled():
+                return fn(*args, **kwargs)
+            try:
+                store, calls_file, params, log_output = setup()
+                bound = signature.bind(*args, **kwargs) if inputs and params else None
+            except Exception:
+                # unresolvable type hints or arguments not matching: the call itself decides
+                return fn(*args, **kwargs)
+            record: dict[str, Any] = {"time": datetime.now().isoformat()}
+            snapshots: dict[str, bytes] = {}
+            if bound:
+                bound.apply_defaults()
+                # serialized before the call, the function may change its inputs
+                for name in params:
+                    snapshot(name, bound.arguments[name], snapshots, record)
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                record["error"] = repr(e)
+                raise
+            else:
+                if log_output:
+                    snapshot("return", result, snapshots, record)
+                return result
+            finally:
+                record["seconds"] = time.perf_counter() - start
+                try:
+                    _writer.submit(store, calls_file, record, snapshots)
+                except Exception as e:
+                    logger().error(f"data log of {fn.__qualname__} not queued: {e}")
+
+        wrapper.data_log_folder = lambda: setup()[1].parent
+        return wrapper
+
+    return decorator(func) if func else decorator
+
+
+class Change(NamedTuple):
+    path: str
+    kind: str  # added, removed, changed
+    old: Any
+    new: Any
+
+
+def diff(old: Any, new: Any, path: str = "") -> list[Change]:
+    """structural diff of two json values (dicts by key, lists by index)"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in old.keys() | new.keys():
+            sub_path = f"{path}.{key}" if path else str(key)
+            if key not in new:
+                changes.append(Change(sub_path, "removed", old[key], None))
+            elif key not in old:
+                changes.append(Change(sub_path, "added", None, new[key]))
+            elif old[key] != new[key]:
+                changes.extend(diff(old[key], new[key], sub_path))
+        return sorted(changes)
+    if isinstance(old, list) and isinstance(new, list):
+        changes = []
+        for index in range(max(len(old), len(new))):
+            sub_path = f"{path}[{index}]"
+            if index >= len(new):
+                changes.append(Change(sub_path, "removed", old[index], None))
+            elif index >= len(old):
+                changes.append(Change(sub_path, "added", None, new[index]))
+            elif old[index] != new[index]:
+                changes.extend(diff(old[index], new[index], sub_path))
+        return changes
+    return [] if old == new else [Change(path, "changed", old, new)]
+
+
+class DataLog:
+    """
+    Reads the log of a decorated function (or its folder) and diffs its snapshots.
+    Diffs compare hashes first, equal snapshots are never loaded.
+    """
+
+    def __init__(self, func_or_folder: Union[Callable, Path], base: Optional[Path] = None):
+        if callable(func_or_folder):
+            folder = (func_or_folder.data_log_folder() if hasattr(func_or_folder, "data_log_folder")
+                      else _function_folder(func_or_folder, base))
+        else:
+            folder = Path(func_or_folder)
+        self.folder = folder
+        self.store = SnapshotStore(base or folder.parent.parent)
+
+    def calls(self) -> list[dict]:
+        calls_file = self.folder / "calls.jsonl"
+        if not calls_file.exists():
+            return []
+        return [orjson.loads(line) for line in calls_file.read_bytes().splitlines() if line]
+
+    def snapshot(self, call: dict, part: str = "output") -> Any:
+        """:param part: "output" or the name of a parameter. None when it was not logged (skipped)"""
+        digest = call["output"] if part == "output" else call["inputs"].get(part)
+        return self.store.get(digest) if digest else None
+
+    def diff(self, old_call: dict, new_call: dict, part: str = "output",
+             other: Optional["DataLog"] = None) -> list[Change]:
+        """
+        Changes of part (output or a parameter) between two calls.
+        other: the log of new_call, when it was logged by a different function
+        """
+        old_digest = old_call["output"] if part == "output" else old_call["inputs"].get(part)
+        new_digest = new_call["output"] if part == "output" else new_call["inputs"].get(part)
+        if old_digest == new_digest:
+            return []
+        new_store = (other or self).store
+        return diff(self.store.get(old_digest) if old_digest else None,
+                    new_store.get(new_digest) if new_digest else None)
+
+
+if __name__ == "__main__":
+    import tempfile
+    import timeit
+
+    records = [{"id": i, "name": f"item {i}", "values": list(range(10))} for i in range(100)]
+
+    def transform(data: list[dict]) -> list[dict]:
+        return [{**record, "total": sum(record["values"])} for record in data]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = timeit.timeit(lambda: transform(records), number=2000)
+        print(f"undecorated: {plain / 2000 * 1e6:.1f}us per call")
+        for rate in (1.0, 0.01):
+            logged = data_log(transform, sample_rate=rate, folder=Path(tmp))
+            seconds = timeit.timeit(lambda: logged(records), number=2000)
+            flush()
+            print(f"sample_rate {rate}: {seconds / 2000 * 1e6:.1f}us per call")
+        calls = DataLog(logged, Path(tmp)).calls()
+        print(f"{len(calls)} calls logged, {len(list(Path(tmp).rglob('*.json.z')))} distinct snapshots")
@@ -0,0 +1,133 @@
+"""
+Export of database rows (docs or any query) to files with constant memory.
+
+Rows are fetched through a server-side cursor in batches (stream_results + yield_per)
+and written while they arrive. Formats by suffix: .jsonl/.ndjson, .csv
+Compression by an extra suffix: .gz, .bz2, .xz, .zst (zstandard)
+
+Example:
+    ```python
+    from tools.db_export import export_query
+
+    export_query(engine, Path("docs.jsonl.gz"), progress=lambda tp: print(tp.summary("rows")))
+    ```
+"""
+import bz2
+import gzip
+import lzma
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union, Callable, Iterator, IO, Any
+
+import orjson
+
+try:
+    import sqlalchemy
+except ImportError:
+    print("Install the optional dependency [database]")
+
+from tools.throughput import Throughput
+from tools.write_csvs import write_csv_rows
+
+_COMPRESSION_SUFFIXES = {".gz", ".bz2", ".xz", ".zst"}
+
+
+def open_output(path: Path, mode: str = "wb") -> IO:
+    """Open a file for writing, compressed according to its last suffix"""
+    encoding = None if "b" in mode else "utf-8"
+    newline = None if "b" in mode else ""
+    if path.suffix == ".gz":
+        return gzip.open(path, mode, encoding=encoding, newline=newline)
+    elif path.suffix == ".bz2":
+        return bz2.open(path, mode, encoding=encoding, newline=newline)
+    elif path.suffix == ".xz":
+        return lzma.open(path, mode, encoding=encoding, newline=newline)
+    elif path.suffix == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstandard not installed")
+        return zstandard.open(path, mode, encoding=encoding, newline=newline)
+    return path.open(mode, encoding=encoding, newline=newline)
+
+
+def export_format(path: Path) -> str:
+    suffixes = [s for s in path.suffixes if s not in _COMPRESSION_SUFFIXES]
+    fmt = suffixes[-1] if suffixes else ""
+    if fmt in (".jsonl", ".ndjson"):
+        return "jsonl"
+    elif fmt == ".csv":
+        return "csv"
+    raise NotImplementedError(f"Export format '{fmt}' not supported")
+
+
+def _statement(query: Union[None, str, "sqlalchemy.Executable"]) -> "sqlalchemy.Executable":
+    if query is None:
+        from tools.create_db import Doc
+        return sqlalchemy.select(Doc.id, Doc.data)
+    if isinstance(query, str):
+        return sqlalchemy.text(query)
+    return query
+
+
+def iter_row_batches(engine: "sqlalchemy.Engine",
+                     query: Union[None, str, "sqlalchemy.Executable"] = None,
+                     batch_size: int = 1000) -> Iterator[tuple[list[str], list[dict]]]:
+    """
+    (column names, rows) batches of a query (default: id and data of all docs) from a server-side cursor
+    """
+    with _row_stream(engine, query, batch_size) as (keys, batches):
+        for rows in batches:
+            yield keys, rows
+
+
+@contextmanager
+def _row_stream(engine: "sqlalchemy.Engine",
+                query: Union[None, str, "sqlalchemy.Executable"],
+                batch_size: int) -> Iterator[tuple[list[str], Iterator[list[dict]]]]:
+    """column names (also of a query without rows) and the row batches"""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(_statement(query))
+        yield list(result.keys()), ([dict(row) for row in partition] for partition in result.mappings().partitions())
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value, default=str).decode()
+    return value
+
+
+def export_query(engine: "sqlalchemy.Engine",
+                 path: Path,
+                 query: Union[None, str, "sqlalchemy.Executable"] = None,
+                 batch_size: int = 1000,
+                 progress: Optional[Callable[[Throughput], None]] = None) -> Throughput:
+    """
+    Stream the rows of query (default: id and data of all docs) into path.
+    In csv, dict and list values are written as json.
+
+    :param progress: called with the throughput after each batch
+    :return: throughput (items: rows, bytes: size of the written file)
+    """
+    fmt = export_format(path)
+    throughput = Throughput()
+
+    def counted(rows: list[dict]) -> list[dict]:
+        throughput.add(len(rows))
+        if progress:
+            progress(throughput)
+        return rows
+
+    with _row_stream(engine, query, batch_size) as (keys, batches):
+        if fmt == "jsonl":
+            with open_output(path, "wb") as f:
+                for rows in batches:
+                    f.write(b"".join(orjson.dumps(row, default=str) + b"\n" for row in counted(rows)))
+        else:
+            with open_output(path, "wt") as f:
+                # the header comes from the result columns, a query without rows gives a header-only file
+                csv_rows = ({key: _csv_value(value) for key, value in row.items()}
+                            for rows in batches for row in counted(rows))
+                write_csv_rows(f, keys, csv_rows)
+    throughput.bytes = path.stat().st_size
+    return throughput.stop()
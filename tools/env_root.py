@@ -1,36 +1,69 @@
 """
 SHOULD NOT IMPORT ANY OTHER TOOL
+
+The root is found once per process: by walking up from the given path until a directory with
+a `.env` file is found, or from the PROJECT_ROOT environment variable (without a path, or no `.env` above it).
+The resolved root is exported as PROJECT_ROOT, so subprocesses inherit it and skip the walk.
+Set PROJECT_ROOT_CHDIR=0 (or pass chdir=False) to not change the working directory.
 """
 import os
-import traceback
-from functools import lru_cache
+import sys
 from pathlib import Path
 from typing import Optional
 
-__SET_ROOT: Path = None
-__FIRST_ROOT_STACK_TRACE = None
+PROJECT_ROOT_ENV = "PROJECT_ROOT"
+PROJECT_ROOT_CHDIR_ENV = "PROJECT_ROOT_CHDIR"
 
+__SET_ROOT: Optional[Path] = None
+__FIRST_ROOT_LOCATION: Optional[str] = None
 
-@lru_cache
-def root(module_path_str: Optional[str] = None) -> Path:
-    global __SET_ROOT, __FIRST_ROOT_STACK_TRACE
-    if __SET_ROOT and not module_path_str:
-        return __SET_ROOT
-    elif not module_path_str:
-        module_path_str = "."
-    else:
-        if __FIRST_ROOT_STACK_TRACE:
-            raise Exception(f"root can only be set once FIRST CALL LOCATION:\n\n {__FIRST_ROOT_STACK_TRACE}")
-        __FIRST_ROOT_STACK_TRACE = ''.join(traceback.format_stack()[:-1])
+
+def _chdir_default() -> bool:
+    return os.environ.get(PROJECT_ROOT_CHDIR_ENV, "1").lower() not in ("0", "false", "no")
+
+
+def _find_root(module_path_str: str) -> Path:
     current = Path(module_path_str).absolute()
     if current.is_file():
-        # print("WARNING: module_path_str is required first time calling root")
-        current = Path(module_path_str).absolute().parent
+        current = current.parent
     while not (current / ".env").exists():
         current = current.parent
         if current == current.parent:
             raise Exception("root not found. '.env' missing. check .template.env")
-    os.chdir(current)
+    return current
+
+
+def bootstrap(path: Optional[str | Path] = None, chdir: Optional[bool] = None) -> Path:
+    """
+    Set the root explicitly, without searching for `.env`.
+    Without a path, PROJECT_ROOT or the current working directory is used.
+    """
+    global __SET_ROOT
+    current = Path(path or os.environ.get(PROJECT_ROOT_ENV) or ".").absolute()
+    if chdir if chdir is not None else _chdir_default():
+        os.chdir(current)
+    os.environ[PROJECT_ROOT_ENV] = str(current)
     __SET_ROOT = current
-    root.cache_clear()
     return current
+
+
+def root(module_path_str: Optional[str] = None, chdir: Optional[bool] = None) -> Path:
+    global __FIRST_ROOT_LOCATION
+    if __SET_ROOT and not module_path_str:
+        return __SET_ROOT
+    if module_path_str:
+        if __FIRST_ROOT_LOCATION:
+            raise Exception(f"root can only be set once FIRST CALL LOCATION:\n\n {__FIRST_ROOT_LOCATION}")
+        caller = sys._getframe(1)
+        __FIRST_ROOT_LOCATION = f'File "{caller.f_code.co_filename}", line {caller.f_lineno}'
+    env_root = os.environ.get(PROJECT_ROOT_ENV)
+    if module_path_str:
+        # an explicit path wins over an inherited PROJECT_ROOT, which is only the fallback without `.env`
+        try:
+            return bootstrap(_find_root(module_path_str), chdir)
+        except Exception:
+            if not env_root:
+                raise
+    if env_root:
+        return bootstrap(env_root, chdir)
+    return bootstrap(_find_root("."), chdir)
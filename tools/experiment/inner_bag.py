@@ -1,39 +1,212 @@
+import os
 import shutil
 from pathlib import Path
+from typing import Optional
 
 import bagit
 
+from tools import checksums
+from tools.files import CopyReport, fast_copy
+from tools.instrumentation import instrument
+
+
+def _files_below(path: Path) -> list[Path]:
+    if path.is_dir():
+        return [p for p in path.rglob("*") if p.is_file()]
+    return [path]
+
 
 class MBag():
 
-    def __init__(self, path: Path, bag: bagit.Bag):
+    def __init__(self, path: Path, bag: bagit.Bag, processes: Optional[int] = None):
+        """
+        :param processes: hashing processes (None: cpu count)
+        """
         self._path = path
         self._bag = bag
+        self.processes = processes
+        # copy_cache statistics of the last add_paths
+        self.copy_report = CopyReport()
+
+    @property
+    def path(self) -> Path:
+        return Path(self._path)
 
     @property
     def data_path(self) -> Path:
         return Path(self._path) / "data"
 
-    def add_paths(self, paths: list[Path], source: list[str] = None):
-        if not self._bag.is_valid():
-            print(f"invalid bag {self._path}. Cannot add paths.")
+    @property
+    def payload_algorithms(self) -> list[str]:
+        return sorted(Path(manifest).stem.removeprefix("manifest-") for manifest in self._bag.manifest_files())
+
+    @instrument("MBag.add_paths")
+    def add_paths(self, paths: list[Path], source: list[str] = None, incremental: bool = True,
+                  hardlink: bool = False) -> "MBag":
+        """
+        Add files or folders to the payload.
+        With incremental, only the added files are hashed and the manifests, Payload-Oxum and tag manifests
+        are updated in place. Otherwise, the whole bag is re-hashed (bagit save with manifests).
+        The bag is not validated, see validate.
 
+        copy_cache only copies files which are new or changed (see _is_unchanged). Content that is already
+        in the payload (same hash in the manifest, e.g. a renamed file) is linked from that payload file,
+        otherwise from the source, by reflink or (with hardlink) a hardlink when possible.
+        Files and bytes copied/skipped are in copy_report.
+        """
         if not source:
             source = ["copy"] * len(paths)
+        self.copy_report = CopyReport()
+
+        # payload paths (relative to the bag) -> size before adding, None for new files
+        previous_sizes: dict[str, int | None] = {}
+        changed: list[Path] = []
+        recount_oxum = False
+
+        def before(destination: Path) -> None:
+            for existing in _files_below(destination) if destination.exists() else []:
+                previous_sizes[existing.relative_to(self._path).as_posix()] = existing.stat().st_size
+
+        def after(destination: Path) -> None:
+            for added in _files_below(destination):
+                previous_sizes.setdefault(added.relative_to(self._path).as_posix(), None)
+                changed.append(added)
 
         for file, source_type in zip(paths, source):
+            destination = self.data_path / file.name
             if source_type == "move":
-                shutil.move(file, self._path / "data")
+                before(destination)
+                shutil.move(file, destination)
+                after(destination)
             elif source_type == "copy":
+                before(destination)
                 if file.is_dir():
-                    shutil.copytree(file, self.data_path/ file.name)
+                    shutil.copytree(file, destination)
                 else:
-                    shutil.copy2(file,self.data_path / file.name)
+                    shutil.copy2(file, destination)
+                after(destination)
             elif source_type == "copy_cache":
-                # todo also if it changed. so update
-                if not (self.data_path / file).exists():
-                    shutil.copy2(file, self.data_path)
+                copied, linked_changed = self._copy_cached(file, destination, previous_sizes, hardlink)
+                changed.extend(copied)
+                recount_oxum = recount_oxum or linked_changed
+
+        if incremental:
+            self.update_manifests(changed, previous_sizes, recount_oxum)
+        else:
+            self._bag.save(processes=self.processes or 1, manifests=True)
+        return self
+
+    def _copy_cached(self, source: Path, destination: Path, previous_sizes: dict[str, int | None],
+                     hardlink: bool) -> tuple[list[Path], bool]:
+        """
+        copy new or changed files of source (file or folder) to destination.
+        A file whose content is already in the payload is copied from that payload file (see _payload_match).
+
+        :return: the copied files and whether a hardlinked payload file was changed through its source
+         (its previous size is unknown)
+        """
+        entries = self._bag.payload_entries()
+        algorithm = self.payload_algorithms[0]
+        # payload paths by size, built on the first new or changed file
+        by_size: Optional[dict[int, list[str]]] = None
+        if source.is_dir():
+            pairs = [(file, destination / file.relative_to(source)) for file in _files_below(source)]
+        else:
+            pairs = [(source, destination)]
+        copied = []
+        linked_changed = False
+        for src, dst in pairs:
+            src_stat = src.stat()
+            rel = dst.relative_to(self._path).as_posix()
+            if dst.exists():
+                dst_stat = dst.stat()
+                if self._is_unchanged(src, src_stat, dst, dst_stat, entries.get(rel, {}).get(algorithm), algorithm):
+                    self.copy_report.add("skipped", src_stat.st_size)
+                    continue
+                previous_sizes.setdefault(rel, dst_stat.st_size)
+                linked_changed = linked_changed or os.path.samestat(src_stat, dst_stat)
+            else:
+                previous_sizes.setdefault(rel, None)
+                dst.parent.mkdir(parents=True, exist_ok=True)
+            if by_size is None:
+                by_size = {}
+                for path in entries:
+                    if (self._path / path).is_file():
+                        by_size.setdefault((self._path / path).stat().st_size, []).append(path)
+            match = self._payload_match(src, src_stat.st_size, rel, by_size, entries, algorithm)
+            method = fast_copy(self._path / match if match else src, dst, hardlink)
+            if match and method != "hardlink":
+                # the mtime of the source, the next add_paths skips it without hashing
+                os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+            self.copy_report.add(method, src_stat.st_size)
+            copied.append(dst)
+        return copied, linked_changed
+
+    @staticmethod
+    def _payload_match(source: Path, size: int, rel: str, by_size: dict[int, list[str]],
+                       entries: dict[str, dict[str, str]], algorithm: str) -> Optional[str]:
+        """
+        Payload path (other than rel) with the same content as source according to the manifest.
+        The source is only hashed when a payload file has the same size.
+        """
+        candidates = [path for path in by_size.get(size, []) if path != rel]
+        if not candidates:
+            return None
+        source_hash = checksums.hash_file(source, [algorithm])[algorithm]
+        return next((path for path in candidates if entries[path].get(algorithm) == source_hash), None)
+
+    @staticmethod
+    def _is_unchanged(source: Path, source_stat: os.stat_result, destination: Path,
+                      destination_stat: os.stat_result, manifest_hash: Optional[str], algorithm: str) -> bool:
+        """
+        Same size and mtime, else same size and the source hash equals the manifest entry.
+        A hardlinked destination shares the stat of the source, so it is always compared by hash.
+        """
+        if manifest_hash is None or source_stat.st_size != destination_stat.st_size:
+            return False
+        same_inode = os.path.samestat(source_stat, destination_stat)
+        if not same_inode and source_stat.st_mtime_ns == destination_stat.st_mtime_ns:
+            return True
+        if checksums.hash_file(source, [algorithm])[algorithm] != manifest_hash:
+            return False
+        if not same_inode:
+            # same content, next time the mtime suffices
+            os.utime(destination, ns=(destination_stat.st_atime_ns, source_stat.st_mtime_ns))
+        return True
+
+    def update_manifests(self, files: list[Path], previous_sizes: dict[str, int | None],
+                         recount_oxum: bool = False) -> None:
+        """
+        Hash files (payload files that were added or changed) and update the payload manifests,
+        Payload-Oxum and the tag manifests. Other payload files are not read.
+
+        :param previous_sizes: size before the change per payload path (relative to the bag), None for new files
+        :param recount_oxum: compute the Payload-Oxum from the payload sizes instead of previous_sizes
+        """
+        algorithms = self.payload_algorithms
+        entries = {path: dict(hashes) for path, hashes in self._bag.payload_entries().items()}
+        hashes, _ = checksums.hash_files(files, algorithms, self.processes)
+        for file, file_hashes in hashes.items():
+            entries[file.relative_to(self._path).as_posix()] = file_hashes
+        checksums.write_manifests(self._path, entries, algorithms, encoding=self._bag.encoding)
+
+        if self._bag.has_oxum() and not recount_oxum:
+            octets, streams = (int(part) for part in self._bag.info["Payload-Oxum"].split("."))
+            for file in files:
+                previous = previous_sizes.get(file.relative_to(self._path).as_posix())
+                octets += file.stat().st_size - (previous or 0)
+                streams += previous is None
+        else:
+            payload = _files_below(self.data_path)
+            octets, streams = sum(p.stat().st_size for p in payload), len(payload)
+        self._bag.info["Payload-Oxum"] = f"{octets}.{streams}"
+        checksums.write_tag_file(self._path / self._bag.tag_file_name, self._bag.info)
+        checksums.write_tagmanifests(self._path, checksums.manifest_algorithms(self._path, tag=True),
+                                     encoding=self._bag.encoding)
+        self._bag = bagit.Bag(str(self._path))
 
-        self._bag.save(manifests=True)
+    def validate(self, fast: bool = False) -> bool:
+        """Full validation re-hashes every payload file, fast only checks the Payload-Oxum"""
+        return checksums.is_valid_bag(self._path, fast, self.processes)
 
-# something which allows, to add folders/files, and it will update the bag /manifest accordingly with the right policies and schema
\ No newline at end of file
+# something which allows, to add folders/files, and it will update the bag /manifest accordingly with the right policies and schema
@@ -1,7 +1,10 @@
 from operator import itemgetter
 from typing import Sequence
 
+from tools.instrumentation import instrument
 
+
+@instrument("levenhstein_get_closest_matches")
 def levenhstein_get_closest_matches(word:str, word_list: Sequence[str], threshold=0.6, max_item: int = 2):
     """
     Find the closest matches to a given word from a list of words using
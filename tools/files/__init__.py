@@ -0,0 +1,243 @@
+import os
+import shutil
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Union, Any, Optional, Iterator, Iterable, Literal
+
+import humanize
+
+from orjson import orjson
+
+from tools import yaml_backend
+from tools.instrumentation import instrument
+from tools.env_root import root, PROJECT_ROOT_ENV
+from tools.files import formats
+from tools.pydantic_annotated_types import json_default
+
+
+def load_json(path: Path) -> dict:
+    import orjson
+    return orjson.loads(path.read_text(encoding="utf-8"))
+
+
+@instrument("files.read_data")
+def read_data(path: Path, config: Optional[dict] = None):
+    """
+    Read data from file, in the format found by tools.files.formats (suffix, compression suffix, content).
+    Formats supported: json, jsonl, yaml, csv, excel, xml, records and registered plugins
+    - json is read straight into a dict
+    - jsonl is read into a list
+    - yaml is read into its (first) document
+    - csv is read into a list of dicts (config: DictReader arguments)
+    - excel is read into a dict of sheet names and lists of rows
+    - records (see save_records) is opened as a RecordFile, the items are models of config["model"] or dicts
+
+    :param config: arguments of the format, "format": name of the format instead of detection
+    """
+    return formats.read(Path(path), config)
+
+
+def iter_data(path: Path, config: Optional[dict] = None) -> Iterator[Any]:
+    """items of a file, one at a time, for formats that support streaming (jsonl, yaml documents, csv rows, records)"""
+    return formats.iterate(Path(path), config)
+
+
+def save_data(path: Union[str, Path], data: Any, config: Optional[dict] = None) -> None:
+    """write data in the format of the suffix, e.g. rows.csv.gz, items.jsonl.zst"""
+    formats.write(Path(path), data, config)
+
+
+@instrument("files.save_json")
+def save_json(path: Union[str, Path], data: Union[dict, Any], indent_2: Optional[bool] = True,
+              encoding: str = "utf-8") -> None:
+    """pydantic models (also in lists and dicts) are dumped in json mode like dump_models, other unknown types by str"""
+    path = Path(path)
+    if indent_2:
+        content = orjson.dumps(
+            data,
+            option=orjson.OPT_INDENT_2,
+            default=json_default
+        )
+    else:
+        content = orjson.dumps(data, default=json_default)
+
+    path.write_bytes(content)
+
+
+def save_records(path: Union[str, Path], models: Iterable[Any]) -> int:
+    """models of one type as a record file (msgpack, indexed), read back by read_data"""
+    from tools.records import write_records
+    return write_records(path, models)
+
+
+def save_yaml(path: Union[str, Path], data: Union[dict, Any], indent_2: Optional[bool] = True,
+              encoding: str = "utf-8") -> None:
+    with Path(path).open("w", encoding=encoding) as f:
+        yaml_backend.dump(data, f, indent=2 if indent_2 else None, default_flow_style=False, allow_unicode=True)
+
+
+def iter_yaml_documents(path: Path) -> Iterator[Any]:
+    """Documents of a multi-document yaml file, loaded one at a time"""
+    with path.open("rb") as f:
+        yield from yaml_backend.load_all(f)
+
+
+def save_yaml_documents(path: Union[str, Path], documents: Iterable[Any], encoding: str = "utf-8") -> None:
+    """Write documents (can be a generator) as a multi-document yaml file"""
+    with Path(path).open("w", encoding=encoding) as f:
+        yaml_backend.dump_all(documents, f, default_flow_style=False, allow_unicode=True)
+
+
+def atomic_write(path: Path, content: Union[str, bytes], encoding: str = "utf-8") -> None:
+    """Write to a temporary file next to path and rename it, readers never see a partial file"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        if isinstance(content, str):
+            tmp_path.write_text(content, encoding=encoding)
+        else:
+            tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+# ioctl request to clone a file (copy on write) on btrfs, xfs, ...
+FICLONE = 0x40049409
+copy_method_literal = Literal["hardlink", "reflink", "copy"]
+
+
+def _clone_or_copy(source: Path, destination: Path) -> copy_method_literal:
+    """reflink, else os.copy_file_range (in kernel, may also share extents), else a buffered copy"""
+    with source.open("rb") as src, destination.open("wb") as dst:
+        try:
+            import fcntl
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return "reflink"
+        except (ImportError, OSError):
+            pass
+        size = os.fstat(src.fileno()).st_size
+        copied = 0
+        try:
+            while copied < size and (count := os.copy_file_range(src.fileno(), dst.fileno(), size - copied)):
+                copied += count
+        except (AttributeError, OSError):
+            copied = 0
+        if copied < size:
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+    return "copy"
+
+
+def fast_copy(source: Path, destination: Path, hardlink: bool = False) -> copy_method_literal:
+    """
+    Copy a file without passing the bytes through python where possible.
+    hardlink (opt-in) shares the inode, so later changes of the source also change the copy.
+    Otherwise a reflink or os.copy_file_range are tried before a plain copy.
+    Metadata is copied like shutil.copy2 and the destination is replaced atomically.
+
+    :return: the method used
+    """
+    tmp_path = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        method: Optional[copy_method_literal] = None
+        if hardlink:
+            try:
+                os.link(source, tmp_path)
+                method = "hardlink"
+            except OSError:  # other filesystem, no permission
+                pass
+        if not method:
+            method = _clone_or_copy(source, tmp_path)
+            shutil.copystat(source, tmp_path)
+        os.replace(tmp_path, destination)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return method
+
+
+@dataclass
+class CopyReport:
+    """files and bytes per copy method ("hardlink", "reflink", "copy") and "skipped" for unchanged files"""
+    files: Counter = field(default_factory=Counter)
+    bytes: Counter = field(default_factory=Counter)
+
+    def add(self, method: str, size: int) -> None:
+        self.files[method] += 1
+        self.bytes[method] += size
+
+    @property
+    def copied_bytes(self) -> int:
+        """bytes actually written, linked and skipped files cost no data"""
+        return self.bytes["copy"]
+
+    @property
+    def skipped_bytes(self) -> int:
+        return self.bytes["skipped"]
+
+    def summary(self) -> str:
+        return ", ".join(f"{method}: {count} files ({humanize.naturalsize(self.bytes[method])})"
+                         for method, count in sorted(self.files.items()))
+
+
+def as_path(path: str | Path) -> Path:
+    return Path(path)
+
+
+# todo test
+def get_abs_path(path: Path, base_dir: Optional[Path] = None) -> Path:
+    if path.is_absolute():
+        return path
+    else:
+        if base_dir is None:
+            return root() / path
+        else:
+            return base_dir / path
+
+
+def relative_to_project_path(path: Path, parenthesis: bool = True) -> str:
+    p = str(path.relative_to(root()))
+    if parenthesis:
+        return f"'{p}'"
+    else:
+        return p
+
+
+def get_latest_file(folder: Path, type_filter: Optional[str] = "*") -> Optional[Path]:
+    """
+    Most recently modified file in folder (not recursive).
+    Folders inside the data folder (of an already resolved project root) are answered
+    by the data catalog index, other folders are scanned.
+
+    :param type_filter: suffix without dot, e.g. "json". "*" for any
+    """
+    suffix = None if type_filter in (None, "*") else f".{type_filter}"
+    project_root = os.environ.get(PROJECT_ROOT_ENV)
+    if project_root and folder.absolute().is_relative_to(Path(project_root).absolute() / "data"):
+        from tools.data_catalog import catalog
+        return catalog().latest(folder, suffix)
+    files = [f for f in folder.glob(f"*{suffix or ''}") if f.is_file()]
+    return max(files, key=lambda f: f.stat().st_mtime) if files else None
+
+
+def levenhstein_get_similar_filenames(filename: str | Path, directory: Path, ignore_suffix: bool = True) -> list[Path]:
+    """
+
+    :param filename:
+    :param directory:
+    :param return_only_filename: instead of full path
+    :param ignore_suffix:
+    :return:
+    """
+    fp: Path = Path(filename) if isinstance(filename, str) else filename
+    # assert fp.relative_to(directory)
+    file_map = {
+        f.stem if ignore_suffix else f.name: f
+        for f in directory.glob("*.*")
+    }
+    search_ = fp.stem if ignore_suffix else fp.name
+    from tools.fast_levenhstein import levenhstein_get_closest_matches
+    return [file_map[fn].stem for fn in levenhstein_get_closest_matches(search_, list(file_map.keys()), threshold=0.4)]
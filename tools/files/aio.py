@@ -0,0 +1,178 @@
+"""
+asyncio counterparts of load_json, read_data and save_json, and chunked reading of large files.
+
+- blocking reads, parses and writes run in a bounded thread pool (configure(max_workers=...))
+- at most per_device operations per storage device (st_dev) run at the same time
+- concurrent load_json / read_data calls for the same path share one read: all callers get the
+  same object, treat it as read-only
+- iter_chunks streams a file without holding it in memory
+
+Example:
+    ```python
+    from tools.files import aio
+
+    data = await aio.load_json(path)
+    async for chunk in aio.iter_chunks(big_file):
+        await response.write(chunk)
+    ```
+"""
+import asyncio
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Union
+
+import orjson
+
+from tools import files
+
+CHUNK_SIZE = 1024 * 1024
+PER_DEVICE = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_per_device = PER_DEVICE
+# semaphores and in flight reads belong to an event loop
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+
+class _LoopState:
+    def __init__(self):
+        self.semaphores: dict[int, asyncio.Semaphore] = {}
+        self.inflight: dict[tuple, asyncio.Future] = {}
+
+
+def configure(max_workers: Optional[int] = None, per_device: int = PER_DEVICE) -> None:
+    """
+    :param max_workers: threads for blocking work, default of ThreadPoolExecutor (min(32, cpus + 4))
+    :param per_device: concurrent operations per storage device
+    """
+    global _executor, _per_device
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = ThreadPoolExecutor(max_workers, thread_name_prefix="files-aio")
+    _per_device = per_device
+    _loop_state.clear()
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        state = _loop_state[loop] = _LoopState()
+    return state
+
+
+@lru_cache(maxsize=1024)
+def _device(directory: str) -> int:
+    path = Path(directory)
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path.stat().st_dev
+
+
+async def _in_executor(func: Callable, *args) -> Any:
+    if _executor is None:
+        configure()
+    return await asyncio.get_running_loop().run_in_executor(_executor, partial(func, *args))
+
+
+async def _on_device(path: Path, func: Callable, *args) -> Any:
+    """run func in the executor, limited by the semaphore of the device of path"""
+    state = _state()
+    device = _device(str(path.absolute().parent))
+    semaphore = state.semaphores.get(device)
+    if semaphore is None:
+        semaphore = state.semaphores[device] = asyncio.Semaphore(_per_device)
+    async with semaphore:
+        return await _in_executor(func, *args)
+
+
+async def _coalesced(key: tuple, read: Callable[[], Awaitable[Any]]) -> Any:
+    """one read per key at a time, concurrent callers await the running one"""
+    state = _state()
+    future = state.inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(read())
+        state.inflight[key] = future
+        future.add_done_callback(lambda _: state.inflight.pop(key, None))
+    # a cancelled caller does not cancel the read of the others
+    return await asyncio.shield(future)
+
+
+async def read_bytes(path: Union[str, Path]) -> bytes:
+    path = Path(path)
+    return await _coalesced(("bytes", str(path.absolute())), lambda: _on_device(path, path.read_bytes))
+
+
+async def load_json(path: Union[str, Path]) -> Any:
+    path = Path(path)
+
+    async def read() -> Any:
+        content = await _on_device(path, path.read_bytes)
+        # parsing does not hold the device
+        return await _in_executor(orjson.loads, content)
+
+    return await _coalesced(("json", str(path.absolute())), read)
+
+
+async def read_data(path: Union[str, Path], config: Optional[dict] = None) -> Any:
+    """files.read_data in the executor, coalesced when there is no config"""
+    path = Path(path)
+    if config:
+        return await _on_device(path, files.read_data, path, config)
+    return await _coalesced(("data", str(path.absolute())), lambda: _on_device(path, files.read_data, path))
+
+
+async def save_json(path: Union[str, Path], data: Any, indent_2: Optional[bool] = True) -> None:
+    path = Path(path)
+    await _on_device(path, files.save_json, path, data, indent_2)
+
+
+async def iter_chunks(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """the content of path in chunks, every chunk is a separate read (other requests interleave)"""
+    path = Path(path)
+    fd = await _on_device(path, os.open, path, os.O_RDONLY)
+    try:
+        offset = 0
+        while chunk := await _on_device(path, os.pread, fd, chunk_size, offset):
+            offset += len(chunk)
+            yield chunk
+    finally:
+        os.close(fd)
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    async def main(folder: Path) -> None:
+        paths = [folder / f"{i}.json" for i in range(20)]
+        for path in paths:
+            files.save_json(path, {"values": list(range(200_000))})
+
+        async def blocking_load(path: Path) -> Any:
+            return files.load_json(path)
+
+        for name, load in (("files.load_json", blocking_load), ("aio.load_json", load_json)):
+            stalls = []
+
+            async def monitor() -> None:
+                while True:
+                    before = time.perf_counter()
+                    await asyncio.sleep(0.001)
+                    stalls.append(time.perf_counter() - before - 0.001)
+
+            monitor_task = asyncio.create_task(monitor())
+            await asyncio.sleep(0.01)
+            start = time.perf_counter()
+            # every file requested 5 times at once
+            await asyncio.gather(*(load(path) for path in paths * 5))
+            seconds = time.perf_counter() - start
+            await asyncio.sleep(0.01)
+            monitor_task.cancel()
+            print(f"{name}: {seconds:.2f}s for {len(paths) * 5} loads, longest event loop stall {max(stalls) * 1000:.1f}ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(main(Path(tmp)))
@@ -0,0 +1,352 @@
+"""
+Registry of file formats for read_data / iter_data / save_data.
+
+A format is a class registered in `formats` (a class_registry.Registry) with its suffixes and magic bytes.
+The format of a file is found by
+- config["format"] (a registered name)
+- the longest registered suffix (".json", ".jsonl", ".yml", or multi-suffix like ".geo.json"), after
+  removing a compression suffix (.gz, .bz2, .xz, .zst)
+- the magic bytes at the start of the (decompressed) content
+Libraries of a format are only imported when a file of the format is read.
+
+Plugins register formats in their own module, or through the entry point group "tools.files.formats"
+(loaded at the first lookup). A format registered later takes over the suffixes of earlier ones.
+
+Example:
+    ```python
+    from tools.files.formats import Format, formats
+
+    @formats.register("parquet")
+    class Parquet(Format):
+        suffixes = (".parquet",)
+        magic = (b"PAR1",)
+
+        def read(self, f, config):
+            import pyarrow.parquet
+            return pyarrow.parquet.read_table(f, **config).to_pylist()
+    ```
+"""
+import bz2
+import gzip
+import importlib
+import io
+import lzma
+from csv import DictReader, DictWriter
+from functools import lru_cache
+from importlib.metadata import entry_points
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterator, Optional
+
+import orjson
+
+from tools import yaml_backend
+from tools.class_registry import Registry
+from tools.pydantic_annotated_types import json_default
+
+ENTRY_POINT_GROUP = "tools.files.formats"
+# bytes read for magic detection
+SNIFF_SIZE = 64
+
+formats = Registry(str(Path(__file__).parent))
+
+
+def _zstd_open(path: Path, mode: str) -> BinaryIO:
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard not installed")
+    return zstandard.open(path, mode)
+
+
+compressions: dict[str, tuple[bytes, Callable[[Path, str], BinaryIO]]] = {
+    ".gz": (b"\x1f\x8b", gzip.open),
+    ".bz2": (b"BZh", bz2.open),
+    ".xz": (b"\xfd7zXZ\x00", lzma.open),
+    ".zst": (b"\x28\xb5\x2f\xfd", _zstd_open),
+}
+
+
+@lru_cache
+def optional_import(module: str, extra: Optional[str] = None):
+    """import of an optional dependency, once"""
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(f"{module} not installed" + (f", install the optional dependency [{extra}]" if extra else ""))
+
+
+class Format:
+    """
+    Base of the formats. read / iter / write work on binary streams (decompressed by the caller),
+    formats that need the file itself (memory maps, ...) override read_path / write_path.
+
+    streaming: iter yields the items of a file one at a time
+    """
+    suffixes: tuple[str, ...] = ()
+    magic: tuple[bytes, ...] = ()
+    streaming: bool = False
+    compressible: bool = True
+
+    def read(self, f: BinaryIO, config: dict) -> Any:
+        raise NotImplementedError(f"{type(self).__name__} can't be read")
+
+    def iter(self, f: BinaryIO, config: dict) -> Iterator[Any]:
+        raise NotImplementedError(f"{type(self).__name__} does not support streaming")
+
+    def write(self, f: BinaryIO, data: Any, config: dict) -> None:
+        raise NotImplementedError(f"{type(self).__name__} can't be written")
+
+    def sniff(self, head: bytes) -> bool:
+        return any(head.startswith(magic) for magic in self.magic)
+
+    def read_path(self, path: Path, compression: Optional[str], config: dict) -> Any:
+        with open_binary(path, compression) as f:
+            return self.read(f, config)
+
+    def iter_path(self, path: Path, compression: Optional[str], config: dict) -> Iterator[Any]:
+        with open_binary(path, compression) as f:
+            yield from self.iter(f, config)
+
+    def write_path(self, path: Path, compression: Optional[str], data: Any, config: dict) -> None:
+        with open_binary(path, compression, "wb") as f:
+            self.write(f, data, config)
+
+
+def open_binary(path: Path, compression: Optional[str] = None, mode: str = "rb") -> BinaryIO:
+    """open path, through the decompressor of compression (a suffix of compressions)"""
+    return compressions[compression][1](path, mode) if compression else path.open(mode)
+
+
+@formats.register("json")
+class Json(Format):
+    suffixes = (".json",)
+
+    def read(self, f: BinaryIO, config: dict) -> Any:
+        return orjson.loads(f.read())
+
+    def write(self, f: BinaryIO, data: Any, config: dict) -> None:
+        f.write(orjson.dumps(data, default=json_default,
+                             option=orjson.OPT_INDENT_2 if config.get("indent_2", True) else 0))
+
+    def sniff(self, head: bytes) -> bool:
+        return head.lstrip()[:1] in (b"{", b"[")
+
+
+@formats.register("jsonl")
+class JsonLines(Format):
+    suffixes = (".jsonl", ".ndjson")
+    streaming = True
+
+    def read(self, f: BinaryIO, config: dict) -> list:
+        return list(self.iter(f, config))
+
+    def iter(self, f: BinaryIO, config: dict) -> Iterator[Any]:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
+    def write(self, f: BinaryIO, data: Any, config: dict) -> None:
+        for item in data:
+            f.write(orjson.dumps(item, default=json_default) + b"\n")
+
+
+@formats.register("yaml")
+class Yaml(Format):
+    """read: the (first) document, iter: the documents of a multi-document file"""
+    suffixes = (".yaml", ".yml")
+    streaming = True
+
+    def read(self, f: BinaryIO, config: dict) -> Any:
+        return yaml_backend.load(f)
+
+    def iter(self, f: BinaryIO, config: dict) -> Iterator[Any]:
+        yield from yaml_backend.load_all(f)
+
+    def write(self, f: BinaryIO, data: Any, config: dict) -> None:
+        with io.TextIOWrapper(f, encoding="utf-8") as text:
+            yaml_backend.dump(data, text, indent=2, default_flow_style=False, allow_unicode=True)
+
+
+@formats.register("csv")
+class Csv(Format):
+    """rows as dicts, config: DictReader / DictWriter arguments"""
+    suffixes = (".csv",)
+    streaming = True
+
+    def read(self, f: BinaryIO, config: dict) -> list[dict]:
+        return list(self.iter(f, config))
+
+    def iter(self, f: BinaryIO, config: dict) -> Iterator[dict]:
+        with io.TextIOWrapper(f, encoding="utf-8", newline="") as text:
+            yield from DictReader(text, **config)
+
+    def write(self, f: BinaryIO, data: Any, config: dict) -> None:
+        rows = iter(data)
+        first = next(rows, None)
+        with io.TextIOWrapper(f, encoding="utf-8", newline="") as text:
+            if first is None and "fieldnames" not in config:
+                # no rows and no fieldnames: nothing to write a header for
+                return
+            writer = DictWriter(text, fieldnames=config.get("fieldnames") or list(first),
+                                **{k: v for k, v in config.items() if k != "fieldnames"})
+            writer.writeheader()
+            if first is not None:
+                writer.writerow(first)
+                writer.writerows(rows)
+
+
+@formats.register("excel")
+class Excel(Format):
+    """dict of sheet names and lists of rows"""
+    suffixes = (".xlsx",)
+    magic = (b"PK\x03\x04",)
+
+    def read(self, f: BinaryIO, config: dict) -> dict[str, list]:
+        openpyxl = optional_import("openpyxl", "excel")
+        # openpyxl needs a seekable file
+        f = f if f.seekable() else io.BytesIO(f.read())
+        workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+        return {sheet.title: list(sheet.values) for sheet in workbook.worksheets}
+
+
+@formats.register("xml")
+class Xml(Format):
+    suffixes = (".xml",)
+    magic = (b"<?xml",)
+
+    def read(self, f: BinaryIO, config: dict) -> dict:
+        return optional_import("xmltodict", "xml2yaml").parse(f)
+
+
+@formats.register("records")
+class Records(Format):
+    """tools.records files, memory mapped, so not compressible. config: model, validate"""
+    suffixes = (".records",)
+    magic = (b"PPTREC1\n",)
+    streaming = True
+    compressible = False
+
+    def read_path(self, path: Path, compression: Optional[str], config: dict) -> Any:
+        from tools.records import RecordFile
+        return RecordFile(path, config.get("model"), config.get("validate", True))
+
+    def iter_path(self, path: Path, compression: Optional[str], config: dict) -> Iterator[Any]:
+        with self.read_path(path, compression, config) as records:
+            yield from records
+
+    def write_path(self, path: Path, compression: Optional[str], data: Any, config: dict) -> None:
+        from tools.records import write_records
+        write_records(path, data, config.get("model"))
+
+
+_plugins_loaded = False
+_indexed_names: list[str] = []
+_suffix_index: dict[str, str] = {}
+
+
+def _load_plugins() -> None:
+    global _plugins_loaded
+    _plugins_loaded = True
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            entry_point.load()
+        except Exception as e:
+            print(f"file format plugin {entry_point.name} failed to load: {e}")
+
+
+@lru_cache
+def get_format(name: str) -> Format:
+    class_obj = formats.get(name)
+    if class_obj is None:
+        raise NotImplementedError(f"File format '{name}' not supported")
+    return class_obj()
+
+
+def _format_names() -> list[str]:
+    """registered format names, the suffix index is rebuilt when formats were registered"""
+    global _indexed_names, _suffix_index
+    if not _plugins_loaded:
+        _load_plugins()
+    names = formats.list_all()
+    if names != _indexed_names:
+        get_format.cache_clear()
+        _indexed_names = names
+        _suffix_index = {suffix.lower(): name for name in names for suffix in formats.get(name).suffixes}
+    return names
+
+
+def _split_suffixes(path: Path) -> tuple[list[str], Optional[str]]:
+    """suffixes of path (lower case) without the compression suffix, and the compression suffix"""
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    compression = suffixes.pop() if suffixes and suffixes[-1] in compressions else None
+    return suffixes, compression
+
+
+def _by_suffix(suffixes: list[str]) -> Optional[str]:
+    """format name of the longest registered suffix"""
+    _format_names()
+    for length in range(len(suffixes), 0, -1):
+        name = _suffix_index.get("".join(suffixes[-length:]))
+        if name:
+            return name
+    return None
+
+
+def detect(path: Path, config: Optional[dict] = None) -> tuple[Format, Optional[str]]:
+    """
+    The format and compression (suffix in compressions) of path, by config["format"], suffix or content.
+    """
+    suffixes, compression = _split_suffixes(path)
+    name = (config or {}).get("format") or _by_suffix(suffixes)
+    if name:
+        return get_format(name), compression
+    if not path.is_file():
+        raise NotImplementedError(f"File format '{path.suffix}' not supported")
+
+    with path.open("rb") as f:
+        head = f.read(SNIFF_SIZE)
+    if compression is None:
+        compression = next((suffix for suffix, (magic, _) in compressions.items() if head.startswith(magic)), None)
+    if compression:
+        with open_binary(path, compression) as f:
+            head = f.read(SNIFF_SIZE)
+    # later registrations first, formats with magic bytes before the ones that guess (json)
+    candidates = [get_format(name) for name in reversed(_format_names())]
+    for fmt in sorted(candidates, key=lambda fmt: not fmt.magic):
+        if fmt.sniff(head):
+            return fmt, compression
+    raise NotImplementedError(f"File format of '{path.name}' not recognized")
+
+
+def _format_config(config: Optional[dict]) -> dict:
+    return {key: value for key, value in (config or {}).items() if key != "format"}
+
+
+def _check_compression(fmt: Format, compression: Optional[str]) -> None:
+    if compression and not fmt.compressible:
+        raise NotImplementedError(f"{type(fmt).__name__} files can't be compressed")
+
+
+def read(path: Path, config: Optional[dict] = None) -> Any:
+    fmt, compression = detect(path, config)
+    _check_compression(fmt, compression)
+    return fmt.read_path(path, compression, _format_config(config))
+
+
+def iterate(path: Path, config: Optional[dict] = None) -> Iterator[Any]:
+    fmt, compression = detect(path, config)
+    _check_compression(fmt, compression)
+    if not fmt.streaming:
+        raise NotImplementedError(f"{type(fmt).__name__} does not support streaming")
+    return fmt.iter_path(path, compression, _format_config(config))
+
+
+def write(path: Path, data: Any, config: Optional[dict] = None) -> None:
+    """write data in the format of config["format"] or the suffix, compressed when path has a compression suffix"""
+    suffixes, compression = _split_suffixes(path)
+    name = (config or {}).get("format") or _by_suffix(suffixes)
+    if name is None:
+        raise NotImplementedError(f"File format '{path.suffix}' not supported")
+    fmt = get_format(name)
+    _check_compression(fmt, compression)
+    fmt.write_path(path, compression, data, _format_config(config))
@@ -0,0 +1,275 @@
+"""
+Streaming bag packing: the tar is written straight from the source files and the payload is hashed
+in the same read (no staging copy). The tag files (bagit.txt, bag-info.txt with the Payload-Oxum,
+manifests and tag manifests) are appended at the end of the tar.
+Optionally zstd compressed and split into volumes.
+
+Output for the bag "bag_x":
+- bag_x.tar or bag_x.tar.zst, written as .part and renamed when complete
+- with volume_size: volumes bag_x.tar[.zst].000, .001, ... and the index bag_x.tar[.zst].vol
+  (json with name, size and sha256 per volume), written last
+
+Example:
+    ```python
+    path, throughput = stream_pack(source, transfer_dir, "bag_x", compression="zstd", volume_size=2**30)
+    with open_bag_tar(path) as tar:
+        tar.extractall(destination, filter="data")
+    ```
+"""
+import hashlib
+import os
+import tarfile
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, Iterable, Iterator, Literal, IO
+
+import orjson
+
+from tools import checksums
+from tools.files import atomic_write
+from tools.throughput import Throughput
+
+ZSTD_SUFFIX = ".zst"
+VOLUME_INDEX_SUFFIX = ".vol"
+BAG_SUFFIXES = (".tar", ".tar" + ZSTD_SUFFIX, VOLUME_INDEX_SUFFIX)
+
+
+def bag_name(file_name: str) -> str:
+    """bag name of a packed bag file (tar, compressed tar or volume index)"""
+    return file_name.removesuffix(VOLUME_INDEX_SUFFIX).removesuffix(ZSTD_SUFFIX).removesuffix(".tar")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstandard not installed")
+    return zstandard
+
+
+class _TeeHashReader:
+    """file wrapper hashing everything read through it"""
+
+    def __init__(self, f: IO[bytes], hashers: Iterable["hashlib._Hash"]):
+        self._f = f
+        self._hashers = list(hashers)
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        for hasher in self._hashers:
+            hasher.update(data)
+        return data
+
+
+class VolumeWriter:
+    """writes a stream into volumes of volume_size bytes (<base>.000, .001, ...), each as .part until full"""
+
+    def __init__(self, base: Path, volume_size: int):
+        self.base = base
+        self.volume_size = volume_size
+        self.volumes: list[dict] = []
+        self._f: Optional[IO[bytes]] = None
+        self._hasher = None
+        self._size = 0
+
+    def _volume_path(self, index: int) -> Path:
+        return self.base.with_name(f"{self.base.name}.{index:03d}")
+
+    def _close_volume(self) -> None:
+        self._f.close()
+        path = self._volume_path(len(self.volumes))
+        os.replace(path.with_name(f"{path.name}.part"), path)
+        self.volumes.append({"name": path.name, "size": self._size, "sha256": self._hasher.hexdigest()})
+        self._f = None
+
+    def write(self, data: bytes) -> int:
+        view = memoryview(data)
+        while view:
+            if self._f is None:
+                path = self._volume_path(len(self.volumes))
+                self._f = path.with_name(f"{path.name}.part").open("wb")
+                self._hasher = hashlib.sha256()
+                self._size = 0
+            chunk = view[:self.volume_size - self._size]
+            self._f.write(chunk)
+            self._hasher.update(chunk)
+            self._size += len(chunk)
+            view = view[len(chunk):]
+            if self._size == self.volume_size:
+                self._close_volume()
+        return len(data)
+
+    def flush(self) -> None:
+        if self._f:
+            self._f.flush()
+
+    def close(self) -> None:
+        if self._f:
+            self._close_volume()
+
+    def abort(self) -> None:
+        if self._f:
+            self._f.close()
+        for path in self.base.parent.glob(f"{self.base.name}.[0-9][0-9][0-9]*"):
+            path.unlink(missing_ok=True)
+
+
+class VolumeReader:
+    """reads the volumes of an index in sequence, checking size and sha256 of each at its end"""
+
+    def __init__(self, index_path: Path):
+        self._directory = index_path.parent
+        self._volumes = iter(orjson.loads(index_path.read_bytes())["volumes"])
+        self._volume: Optional[dict] = None
+        self._f: Optional[IO[bytes]] = None
+
+    def _verify(self) -> None:
+        self._f.close()
+        self._f = None
+        if (self._size, self._hasher.hexdigest()) != (self._volume["size"], self._volume["sha256"]):
+            raise ValueError(f"Volume {self._volume['name']} is incomplete or corrupt")
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._f is None:
+                self._volume = next(self._volumes, None)
+                if self._volume is None:
+                    return b""
+                self._f = (self._directory / self._volume["name"]).open("rb")
+                self._hasher = hashlib.sha256()
+                self._size = 0
+            data = self._f.read(size)
+            if data:
+                self._hasher.update(data)
+                self._size += len(data)
+                return data
+            self._verify()
+
+    def close(self) -> None:
+        if self._f:
+            self._f.close()
+
+
+def _add_bytes(tar: tarfile.TarFile, arcname: str, content: bytes) -> None:
+    info = tarfile.TarInfo(arcname)
+    info.size = len(content)
+    info.mtime = int(time.time())
+    tar.addfile(info, BytesIO(content))
+
+
+def _tag_files(entries: dict[str, dict[str, str]], algorithms: list[str], info: Optional[dict],
+               throughput: Throughput) -> list[tuple[str, bytes]]:
+    tag_files = [("bagit.txt", checksums.BAGIT_TXT.encode()),
+                 ("bag-info.txt", checksums.tag_file_text(
+                     checksums.bag_info(info, throughput.bytes, throughput.items)).encode())]
+    tag_files += [(f"manifest-{alg}.txt", checksums.manifest_text(entries, alg).encode()) for alg in algorithms]
+    hashes = {name: {alg: hashlib.new(alg, content).hexdigest() for alg in algorithms} for name, content in tag_files}
+    return tag_files + [(f"tagmanifest-{alg}.txt", checksums.tagmanifest_text(hashes, alg).encode())
+                        for alg in algorithms]
+
+
+def stream_pack(source_path: Path,
+                output_dir: Path,
+                name: str,
+                info: Optional[dict] = None,
+                algorithms: Optional[list[str]] = None,
+                compression: Optional[Literal["zstd"]] = None,
+                level: int = 3,
+                volume_size: Optional[int] = None) -> tuple[Path, Throughput]:
+    """
+    Pack all files below source_path as the payload of the bag name, in one read per file.
+
+    :param compression: "zstd" (needs zstandard)
+    :param volume_size: split the output into volumes of this many bytes
+    :return: the tar (or volume index) and the throughput (items: payload files, bytes: payload bytes)
+    """
+    algorithms = algorithms or checksums.DEFAULT_ALGORITHMS
+    tar_path = output_dir / (f"{name}.tar" + (ZSTD_SUFFIX if compression == "zstd" else ""))
+    part_path = tar_path.with_name(f"{tar_path.name}.part")
+    raw = VolumeWriter(tar_path, volume_size) if volume_size else part_path.open("wb")
+    throughput = Throughput()
+    try:
+        out = raw
+        if compression == "zstd":
+            out = _zstandard().ZstdCompressor(level=level).stream_writer(raw, closefd=False)
+        with tarfile.open(fileobj=out, mode="w|") as tar:
+            entries: dict[str, dict[str, str]] = {}
+            for file in sorted(p for p in source_path.rglob("*") if p.is_file()):
+                rel = f"data/{file.relative_to(source_path).as_posix()}"
+                tarinfo = tar.gettarinfo(file, arcname=f"{name}/{rel}")
+                hashers = {alg: hashlib.new(alg) for alg in algorithms}
+                with file.open("rb") as f:
+                    tar.addfile(tarinfo, _TeeHashReader(f, hashers.values()))
+                entries[rel] = {alg: hasher.hexdigest() for alg, hasher in hashers.items()}
+                throughput.add(1, tarinfo.size)
+            for tag_name, content in _tag_files(entries, algorithms, info, throughput):
+                _add_bytes(tar, f"{name}/{tag_name}", content)
+        if out is not raw:
+            out.close()
+        raw.close()
+    except BaseException:
+        if isinstance(raw, VolumeWriter):
+            raw.abort()
+        else:
+            raw.close()
+            part_path.unlink(missing_ok=True)
+        raise
+
+    if isinstance(raw, VolumeWriter):
+        tar_path = tar_path.with_name(f"{tar_path.name}{VOLUME_INDEX_SUFFIX}")
+        atomic_write(tar_path, orjson.dumps({"name": name, "volumes": raw.volumes}, option=orjson.OPT_INDENT_2))
+    else:
+        os.replace(part_path, tar_path)
+    return tar_path, throughput.stop()
+
+
+@contextmanager
+def open_bag_tar(path: Path) -> Iterator[tarfile.TarFile]:
+    """
+    Open a packed bag (.tar, .tar.zst or a volume index .vol) as a tar stream.
+    Volumes are checked against the index while reading, also the ones after the end of the tar.
+    """
+    raw = VolumeReader(path) if path.name.endswith(VOLUME_INDEX_SUFFIX) else path.open("rb")
+    try:
+        stream = raw
+        if path.name.removesuffix(VOLUME_INDEX_SUFFIX).endswith(ZSTD_SUFFIX):
+            stream = _zstandard().ZstdDecompressor().stream_reader(raw, closefd=False)
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            yield tar
+        # rest of the stream (tar padding), verifies the last volumes
+        while raw.read(1024 * 1024):
+            pass
+    finally:
+        raw.close()
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    from tools.checksums import make_bag
+
+    source = Path(tempfile.mkdtemp())
+    output = Path(tempfile.mkdtemp())
+    # 32 files of 16MB
+    for i in range(32):
+        (source / f"file_{i}.bin").write_bytes(os.urandom(16 * 1024 * 1024))
+    try:
+        start = time.perf_counter()
+        staging = output / "staging"
+        shutil.copytree(source, staging)
+        make_bag(staging, {}, processes=1)
+        with tarfile.open(output / "staged.tar", "w") as tar:
+            tar.add(staging, arcname="staged")
+        shutil.rmtree(staging)
+        print(f"staging copy, make_bag, tar: {time.perf_counter() - start:.2f}s")
+
+        path, throughput = stream_pack(source, output, "streamed")
+        print(f"stream_pack: {throughput.summary('files')}")
+        path, throughput = stream_pack(source, output, "split", volume_size=100 * 1024 * 1024)
+        print(f"stream_pack in volumes of 100MB: {throughput.summary('files')}")
+    finally:
+        shutil.rmtree(source)
+        shutil.rmtree(output)
@@ -1,12 +1,24 @@
+import ctypes
+import ctypes.util
 import os
+import select
 import shutil
-import tarfile
-import bagit
+import struct
+import sys
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from pathlib import Path
 from datetime import datetime
+from typing import Optional, Callable, Union, Literal
 import time
 
+import orjson
+
+from tools.checksums import validate_bag
+from tools.gen.bag_stream import BAG_SUFFIXES, bag_name, open_bag_tar, stream_pack
+from tools.throughput import Throughput
+
 
 #from config import CONFIG
 
@@ -18,86 +30,298 @@ logging.basicConfig(
 logger = logging.getLogger('BagitTransfer')
 
 
-def pack_and_transfer(source_path: Path, transfer_dir: Path) -> None:
+def pack_and_transfer(source_path: Path, transfer_dir: Path,
+                      compression: Optional[Literal["zstd"]] = None,
+                      volume_size: Optional[int] = None) -> Path:
     """
     Pack files into a BagIt bag and transfer it.
+    The tar is streamed from the source files (see bag_stream.stream_pack), written as .tar.part and
+    renamed when complete. Receivers only take complete files (.tar, .tar.zst, .vol volume index).
 
     Args:
         source_path: Directory containing files to bag
         transfer_dir: Where to put the packed bag
+        compression: "zstd" to compress the tar
+        volume_size: Split into volumes of this many bytes
     """
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     bag_name = f"bag_{timestamp}"
-    temp_bag_dir = Path(f"/tmp/{bag_name}")
 
-    try:
-        # Create bag
-        logger.info(f"Creating bag from {source_path}")
-        bagit.make_bag(
-            temp_bag_dir,
-            {
-                "Source-Organization": "BagIt Transfer",
-                "Bagging-Date": timestamp,
-            }
-        )
-
-        # Copy files into bag's data directory
-        for item in source_path.iterdir():
-            if item.is_file():
-                shutil.copy2(item, temp_bag_dir / "data")
-
-        # Create tarball
-        tar_path = transfer_dir / f"{bag_name}.tar"
-        logger.info(f"Creating tarball at {tar_path}")
-        with tarfile.open(tar_path, "w") as tar:
-            tar.add(temp_bag_dir, arcname=bag_name)
-
-        logger.info(f"Successfully transferred bag to {tar_path}")
+    logger.info(f"Packing bag from {source_path}")
+    tar_path, throughput = stream_pack(
+        source_path,
+        transfer_dir,
+        bag_name,
+        {
+            "Source-Organization": "BagIt Transfer",
+            "Bagging-Date": timestamp,
+        },
+        compression=compression,
+        volume_size=volume_size
+    )
+    logger.info(f"Successfully transferred bag to {tar_path}: {throughput.summary('files')}")
+    return tar_path
+
+
+class ReceiveJournal:
+    """
+    Persistent state of received tars: a jsonl file with one line per finished attempt,
+    the last line of a tar is its state. Survives restarts, a torn last line is ignored.
+    A tar is identified by name, size and mtime: a tar sent again under the same name starts over.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: dict[str, dict] = {}
+        if path.exists():
+            for line in path.read_bytes().splitlines():
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                self._state[record["name"]] = record
+
+    def _get(self, name: str, stat: Optional[os.stat_result]) -> dict:
+        """state of name, empty when stat (of the tar now) is not the one of the journal"""
+        record = self._state.get(name, {})
+        if stat is not None and (record.get("size"), record.get("mtime_ns")) != (stat.st_size, stat.st_mtime_ns):
+            return {}
+        return record
+
+    def done(self, name: str, stat: Optional[os.stat_result] = None) -> bool:
+        return self._get(name, stat).get("status") == "done"
+
+    def attempts(self, name: str, stat: Optional[os.stat_result] = None) -> int:
+        return self._get(name, stat).get("attempts", 0)
+
+    def record(self, name: str, status: str, stat: Optional[os.stat_result] = None, **details) -> dict:
+        with self._lock:
+            record = {"name": name, "status": status, "attempts": self.attempts(name, stat) + 1,
+                      "time": datetime.now().isoformat(), **details}
+            if stat is not None:
+                record.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            with self.path.open("ab") as f:
+                f.write(orjson.dumps(record) + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._state[name] = record
+            return record
+
+
+class _InotifyWatcher:
+    """names of files closed after writing or moved into a directory, via inotify (linux, ctypes)"""
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_Q_OVERFLOW = 0x00004000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory: Path, rescan: Callable[[], list[str]]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._rescan = rescan
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.IN_CLOSE_WRITE | self.IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def read(self, timeout: float) -> list[str]:
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        names, offset = [], 0
+        while offset < len(data):
+            _, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            if mask & self.IN_Q_OVERFLOW:
+                # events were dropped
+                return self._rescan()
+            names.append(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+            offset += length
+        return names
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _PollingWatcher:
+    """fallback without inotify: the directory listing every interval"""
 
+    def __init__(self, rescan: Callable[[], list[str]]):
+        self._rescan = rescan
+
+    def read(self, timeout: float) -> list[str]:
+        time.sleep(timeout)
+        return self._rescan()
+
+    def close(self) -> None:
+        pass
+
+
+def unpack_bag(tar_path: Path, destination_dir: Path, fast: bool = False,
+               processes: Optional[int] = None) -> Throughput:
+    """
+    Unpack a packed bag (.tar, .tar.zst, .vol) into a temporary folder, validate and only then
+    move the bag into destination_dir.
+    Members are extracted with the "data" filter (no absolute paths, links outside, devices).
+    """
+    name = bag_name(tar_path.name)
+    temp_dir = destination_dir / f".{name}.unpacking"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    try:
+        with open_bag_tar(tar_path) as tar:
+            tar.extractall(temp_dir, filter="data")
+        extracted = temp_dir / name if (temp_dir / name).is_dir() else next(temp_dir.iterdir())
+        result = validate_bag(extracted, fast=fast, processes=processes)
+        if result.errors:
+            raise ValueError(f"Bag validation failed: {'; '.join(result.errors[:10])}")
+        bag_path = destination_dir / name
+        if bag_path.exists():
+            shutil.rmtree(bag_path)
+        os.replace(extracted, bag_path)
+        return result
     finally:
-        # Cleanup
-        if temp_bag_dir.exists():
-            shutil.rmtree(temp_bag_dir)
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
 
-def receive_and_unpack(transfer_dir: Path, destination_dir: Path) -> None:
+class BagReceiver:
     """
-    Watch for new bags, unpack them when they arrive.
+    Unpacks and validates tars arriving in transfer_dir.
 
-    Args:
-        transfer_dir: Directory to watch for new bags
-        destination_dir: Where to unpack the bags
+    - Arrivals are noticed by inotify, with polling as fallback (non linux, inotify limits).
+    - Senders write "<name>.tar.part" and rename it to "<name>.tar" when complete, only complete
+      files are taken (.tar, .tar.zst and the .vol index of volumes, written after the volumes).
+    - Jobs run in a pool of workers. At most 2 * workers are queued, the watcher waits for a free slot.
+    - The journal (jsonl) keeps done and failed tars across restarts. Failed tars are retried
+      with exponential backoff up to max_attempts. A tar sent again (other size or mtime) is processed again.
+    - With process_existing, tars already in transfer_dir at the start are processed (unless in the journal),
+      e.g. arrivals while the receiver was not running.
     """
-    processed = set()
 
-    # Get initial list of processed files
-    for file in transfer_dir.glob("*.tar"):
-        processed.add(file.name)
+    def __init__(self, transfer_dir: Path, destination_dir: Path,
+                 workers: int = 2,
+                 max_attempts: int = 3,
+                 retry_delay: float = 5.0,
+                 fast: bool = False,
+                 processes: Optional[int] = None,
+                 journal_path: Optional[Path] = None,
+                 use_inotify: bool = True,
+                 poll_interval: float = 1.0,
+                 process_existing: bool = True):
+        self.transfer_dir = transfer_dir
+        self.destination_dir = destination_dir
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.fast = fast
+        self.processes = processes
+        self.use_inotify = use_inotify
+        self.poll_interval = poll_interval
+        self.process_existing = process_existing
+        destination_dir.mkdir(parents=True, exist_ok=True)
+        self.journal = ReceiveJournal(journal_path or destination_dir / ".received.jsonl")
+        self._slots = threading.BoundedSemaphore(2 * workers)
+        self._lock = threading.Lock()
+        self._in_flight: set[str] = set()
+        self._retry_at: dict[str, float] = {}
+        # without process_existing: tars present at the start (name -> size, mtime), until they change
+        self._existing: dict[str, tuple[int, int]] = {}
 
-    while True:
-        # Look for new tar files
-        for tar_path in transfer_dir.glob("*.tar"):
-            if tar_path.name not in processed:
-                logger.info(f"New bag found: {tar_path}")
-                try:
-                    # Unpack the tar file
-                    with tarfile.open(tar_path) as tar:
-                        tar.extractall(destination_dir)
+    def _scan(self) -> list[str]:
+        return sorted(entry.name for entry in os.scandir(self.transfer_dir) if entry.name.endswith(BAG_SUFFIXES))
+
+    def _watcher(self) -> Union[_InotifyWatcher, _PollingWatcher]:
+        if self.use_inotify and sys.platform.startswith("linux"):
+            try:
+                return _InotifyWatcher(self.transfer_dir, self._scan)
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify not available ({e}), polling {self.transfer_dir}")
+        return _PollingWatcher(self._scan)
+
+    def _due_retries(self) -> list[str]:
+        now = time.monotonic()
+        with self._lock:
+            due = [name for name, at in self._retry_at.items() if at <= now]
+            for name in due:
+                del self._retry_at[name]
+        return due
+
+    def _schedule(self, pool: ThreadPoolExecutor, names: list[str]) -> None:
+        for name in names:
+            if not name.endswith(BAG_SUFFIXES):
+                continue
+            try:
+                stat = (self.transfer_dir / name).stat()
+            except FileNotFoundError:
+                continue
+            if self._existing.get(name) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            with self._lock:
+                if (name in self._in_flight or name in self._retry_at or self.journal.done(name, stat)
+                        or self.journal.attempts(name, stat) >= self.max_attempts):
+                    continue
+                self._in_flight.add(name)
+            # backpressure
+            self._slots.acquire()
+            future = pool.submit(unpack_bag, self.transfer_dir / name, self.destination_dir,
+                                 self.fast, self.processes)
+            future.add_done_callback(lambda f, name=name, stat=stat: self._finished(name, stat, f))
+
+    def _finished(self, name: str, stat: os.stat_result, future: Future) -> None:
+        try:
+            error = future.exception()
+            if error is None:
+                result = future.result()
+                self.journal.record(name, "done", stat, summary=result.summary("files"))
+                logger.info(f"Successfully unpacked and verified {name}: {result.summary('files')}")
+            else:
+                record = self.journal.record(name, "failed", stat, error=str(error))
+                if record["attempts"] < self.max_attempts:
+                    delay = self.retry_delay * 2 ** (record["attempts"] - 1)
+                    with self._lock:
+                        self._retry_at[name] = time.monotonic() + delay
+                    logger.error(f"Error processing {name} (attempt {record['attempts']}), retry in {delay}s: {error}")
+                else:
+                    logger.error(f"Error processing {name}, giving up after {record['attempts']} attempts: {error}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(name)
+            self._slots.release()
 
-                    bag_path = destination_dir / tar_path.stem
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        """Process tars arriving (and present, with process_existing) until stop is set (forever without stop)"""
+        stop = stop or threading.Event()
+        watcher = self._watcher()
+        try:
+            with ThreadPoolExecutor(self.workers) as pool:
+                if self.process_existing:
+                    self._schedule(pool, self._scan())
+                else:
+                    for name in self._scan():
+                        stat = (self.transfer_dir / name).stat()
+                        self._existing[name] = (stat.st_size, stat.st_mtime_ns)
+                while not stop.is_set():
+                    self._schedule(pool, watcher.read(self.poll_interval))
+                    self._schedule(pool, self._due_retries())
+        finally:
+            watcher.close()
 
-                    # Verify the bag
-                    bag = bagit.Bag(bag_path)
-                    if bag.is_valid():
-                        logger.info(f"Successfully unpacked and verified {tar_path}")
-                        processed.add(tar_path.name)
-                    else:
-                        logger.error(f"Bag validation failed for {tar_path}")
 
-                except Exception as e:
-                    logger.error(f"Error processing {tar_path}: {e}")
+def receive_and_unpack(transfer_dir: Path, destination_dir: Path,
+                       fast: bool = False, processes: Optional[int] = None, workers: int = 2) -> None:
+    """
+    Watch for new bags, unpack them when they arrive. See BagReceiver.
 
-        time.sleep(1)  # Wait before checking again
+    Args:
+        transfer_dir: Directory to watch for new bags
+        destination_dir: Where to unpack the bags
+        fast: Only check the Payload-Oxum instead of re-hashing the payload
+        processes: Hashing processes for the full validation (None: cpu count)
+        workers: Bags unpacked and validated at the same time
+    """
+    BagReceiver(transfer_dir, destination_dir, workers=workers, fast=fast, processes=processes).run()
 
 
 if __name__ == "__main__":
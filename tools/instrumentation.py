@@ -0,0 +1,215 @@
+"""
+Opt-in timing of the hot paths of the package: latency histograms and error counts per operation,
+plus free counters, kept in-process and exported as Prometheus text or json.
+
+Disabled by default (a flag check per call), enabled by TOOLS_INSTRUMENTATION=1 in the environment or enable().
+Instrumented: files.read_data, files.save_json, LoggingManager.add_logger, MBag.add_paths,
+levenhstein_get_closest_matches, Registry.load_instances.
+
+Example:
+    ```python
+    from tools import instrumentation
+
+    instrumentation.enable()
+    read_data(path)
+    with instrumentation.timer("parse"):
+        ...
+    instrumentation.count("rows", 1000)
+    print(instrumentation.to_prometheus())
+    ```
+"""
+import functools
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Optional, Union
+
+import orjson
+
+INSTRUMENTATION_ENV = "TOOLS_INSTRUMENTATION"
+# upper bounds in seconds, the prometheus client defaults with finer buckets below 5ms
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+           0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+PROMETHEUS_PREFIX = "tools"
+
+_enabled = os.environ.get(INSTRUMENTATION_ENV, "0") == "1"
+_lock = threading.Lock()
+
+
+class Histogram:
+    """latencies of one operation: counts per bucket (not cumulative, the last one is +Inf), sum and errors"""
+    __slots__ = ("buckets", "count", "sum", "errors")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.errors += error
+
+    def as_dict(self) -> dict:
+        cumulative, total = {}, 0
+        for bound, count in zip((*BUCKETS, "+Inf"), self.buckets):
+            total += count
+            cumulative[str(bound)] = total
+        return {"count": self.count, "sum": self.sum, "errors": self.errors, "buckets": cumulative}
+
+
+_operations: dict[str, Histogram] = {}
+_counters: dict[str, float] = {}
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _operations.clear()
+        _counters.clear()
+
+
+def observe(name: str, seconds: float, error: bool = False) -> None:
+    with _lock:
+        histogram = _operations.get(name)
+        if histogram is None:
+            histogram = _operations[name] = Histogram()
+        histogram.observe(seconds, error)
+
+
+def count(name: str, value: float = 1) -> None:
+    """add value to the counter name (when enabled)"""
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        observe(self.name, time.perf_counter() - self.start, exc_type is not None)
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timer(name: str) -> Union[_Timer, _NoTimer]:
+    """context manager timing a block as the operation name, a shared no-op when disabled"""
+    return _Timer(name) if _enabled else _NO_TIMER
+
+
+def instrument(name_or_func: Union[str, Callable, None] = None) -> Callable:
+    """
+    Decorator timing every call of a function as an operation (default name: module.qualname).
+    Exceptions are counted as errors of the operation.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        name = name_or_func if isinstance(name_or_func, str) else f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                observe(name, time.perf_counter() - start, error)
+
+        return wrapper
+
+    return decorator(name_or_func) if callable(name_or_func) else decorator
+
+
+def snapshot() -> dict[str, Any]:
+    """{"operations": {name: {count, sum, errors, buckets (cumulative by upper bound)}}, "counters": {name: value}}"""
+    with _lock:
+        return {"operations": {name: histogram.as_dict() for name, histogram in sorted(_operations.items())},
+                "counters": dict(sorted(_counters.items()))}
+
+
+def to_json(data: Optional[dict] = None) -> bytes:
+    """:param data: a snapshot, default the current one"""
+    return orjson.dumps(data or snapshot(), option=orjson.OPT_INDENT_2)
+
+
+def _metric_name(name: str) -> str:
+    return f"{PROMETHEUS_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(data: Optional[dict] = None) -> str:
+    """Prometheus text format of a snapshot (default the current one)"""
+    data = data or snapshot()
+    duration = f"{PROMETHEUS_PREFIX}_operation_duration_seconds"
+    errors = f"{PROMETHEUS_PREFIX}_operation_errors_total"
+    lines = [f"# HELP {duration} Duration of instrumented operations.", f"# TYPE {duration} histogram"]
+    for name, operation in data["operations"].items():
+        label = f'operation="{_label(name)}"'
+        lines += [f'{duration}_bucket{{{label},le="{bound}"}} {total}' for bound, total in operation["buckets"].items()]
+        lines += [f"{duration}_sum{{{label}}} {operation['sum']}", f"{duration}_count{{{label}}} {operation['count']}"]
+    lines += [f"# HELP {errors} Failed calls of instrumented operations.", f"# TYPE {errors} counter"]
+    lines += [f'{errors}{{operation="{_label(name)}"}} {operation["errors"]}'
+              for name, operation in data["operations"].items()]
+    for name, value in data["counters"].items():
+        metric = f"{_metric_name(name)}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    import timeit
+
+    def work(x: int) -> int:
+        return x + 1
+
+    instrumented = instrument(work)
+    number = 1_000_000
+    print(f"plain: {timeit.timeit(lambda: work(1), number=number) / number * 1e9:.0f}ns per call")
+    disable()
+    print(f"instrumented, disabled: {timeit.timeit(lambda: instrumented(1), number=number) / number * 1e9:.0f}ns")
+    enable()
+    print(f"instrumented, enabled: {timeit.timeit(lambda: instrumented(1), number=number) / number * 1e9:.0f}ns")
+    print(to_prometheus())
@@ -1,5 +1,26 @@
+"""
+Bags in the local app data folder (appdirs) and a SQLite catalog of them.
+
+The catalog (.bags.sqlite in the store) keeps name, path, size, Payload-Oxum, Bagging-Date and
+the bag-info of every bag made by local_bag/_create_bag or found in the store.
+reconcile brings it up to date: the store is only re-listed when its mtime changed and a bag is
+only re-read when its bag-info.txt changed (MBag rewrites it on every update).
+
+Example:
+    ```python
+    from tools.local_bags import bag_catalog, list_local_bags
+
+    list_local_bags()
+    bag_catalog().search(name="survey_*", info={"Source-Organization": "lab"})
+    ```
+"""
+import os
+import sqlite3
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional, Union, NamedTuple
+
+import orjson
 
 try:
     import appdirs
@@ -7,6 +28,7 @@ try:
 except ImportError:
     print("install the optional dependencies [bags]")
 # from tools.env_root import project_name
+from tools.checksums import make_bag, read_tag_file
 from tools.experiment.inner_bag import MBag
 from tools.mkdir import SmartPath, exist_literal, source_handling_literal
 
@@ -22,28 +44,196 @@ def _create_bag(files: list[Path],
                destination: Path,
                info: dict[str, Any],
                exists: exist_literal = "create",
-               source: list[source_handling_literal] = None) -> MBag:
+               source: list[source_handling_literal] = None,
+               processes: Optional[int] = None) -> MBag:
 
     _path = SmartPath(destination, **{"exist" : exists})
-    bag = bagit.make_bag(destination, info)
+    bag = make_bag(destination, info, processes=processes)
 
-    return MBag(destination, bag).add_paths(
+    mbag = MBag(destination, bag, processes).add_paths(
         files,
         source,
     )
+    bag_catalog().record(mbag.path)
+    return mbag
 
 def local_bag(files: list[Path],
                name: str,
                info: dict[str, Any],
-               source: list[source_handling_literal] = None) -> MBag:
+               source: list[source_handling_literal] = None,
+               processes: Optional[int] = None) -> MBag:
 
     bag_dir = ad / ("error",name)
-    bag = bagit.make_bag(bag_dir, info)
-    bag.save(manifests=True)
-    return MBag(bag_dir, bag).add_paths(
+    bag = make_bag(bag_dir, info, processes=processes)
+    mbag = MBag(bag_dir, bag, processes).add_paths(
         files,
         source,
     )
+    bag_catalog().record(mbag.path)
+    return mbag
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bags (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    octets INTEGER,
+    streams INTEGER,
+    created TEXT,
+    info TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_bags_name ON bags (name);
+CREATE INDEX IF NOT EXISTS ix_bags_created ON bags (created);
+CREATE TABLE IF NOT EXISTS store (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class LocalBagEntry(NamedTuple):
+    name: str
+    path: Path
+    size: int
+    octets: Optional[int]
+    streams: Optional[int]
+    created: Optional[str]
+    info: dict
+
+
+class BagCatalog:
+    """
+    SQLite index of bags, by default of the bags in the app data folder.
+
+    @param root: store folder. its sub folders with a bagit.txt are bags
+    @param db_path: location of the sqlite file. default: root/.bags.sqlite
+    """
+
+    def __init__(self, root: Union[str, Path], db_path: Optional[Path] = None):
+        self.root = Path(root).absolute()
+        self.db_path = Path(db_path) if db_path else self.root / ".bags.sqlite"
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @staticmethod
+    def _read(bag_dir: Path) -> tuple:
+        info_file = bag_dir / "bag-info.txt"
+        mtime_ns = info_file.stat().st_mtime_ns
+        info = read_tag_file(info_file)
+        octets = streams = None
+        if isinstance(info.get("Payload-Oxum"), str):
+            octets, streams = (int(part) for part in info["Payload-Oxum"].split("."))
+        # payload (oxum) and tag files, no walk over the payload
+        tag_size = sum(entry.stat().st_size for entry in os.scandir(bag_dir) if entry.is_file())
+        created = info.get("Bagging-Date")
+        return (str(bag_dir), bag_dir.name, (octets or 0) + tag_size, octets, streams,
+                created if isinstance(created, str) else None, orjson.dumps(info).decode(), mtime_ns)
+
+    def record(self, bag_dir: Path) -> None:
+        """add or update a bag"""
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO bags VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               self._read(Path(bag_dir).absolute()))
+
+    def reconcile(self, force: bool = False) -> dict[str, int]:
+        """
+        Update the index from the file system. The store is only listed when its mtime changed (or force),
+        known bags are only re-read when the mtime of their bag-info.txt changed.
+
+        @return: counts of added, updated, removed and unchanged bags
+        """
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        known = dict(self._conn.execute("SELECT path, mtime_ns FROM bags"))
+        candidates = set(known)
+        root_mtime_ns = self.root.stat().st_mtime_ns
+        indexed = self._conn.execute("SELECT value FROM store WHERE key = 'root_mtime_ns'").fetchone()
+        if force or not indexed or indexed[0] != root_mtime_ns:
+            candidates.update(entry.path for entry in os.scandir(self.root)
+                              if entry.is_dir() and os.path.isfile(os.path.join(entry.path, "bagit.txt")))
+
+        removed, upserts = [], []
+        for path in candidates:
+            try:
+                mtime_ns = os.stat(os.path.join(path, "bag-info.txt")).st_mtime_ns
+            except FileNotFoundError:
+                if path in known:
+                    removed.append(path)
+                continue
+            if known.get(path) == mtime_ns:
+                counts["unchanged"] += 1
+                continue
+            counts["added" if path not in known else "updated"] += 1
+            upserts.append(self._read(Path(path)))
+        counts["removed"] = len(removed)
+
+        with self._conn:
+            self._conn.executemany("DELETE FROM bags WHERE path = ?", ((p,) for p in removed))
+            self._conn.executemany("INSERT OR REPLACE INTO bags VALUES (?, ?, ?, ?, ?, ?, ?, ?)", upserts)
+            self._conn.execute("INSERT OR REPLACE INTO store VALUES ('root_mtime_ns', ?)", (root_mtime_ns,))
+        return counts
+
+    @staticmethod
+    def _entry(row: tuple) -> LocalBagEntry:
+        name, path, size, octets, streams, created, info = row
+        return LocalBagEntry(name, Path(path), size, octets, streams, created, orjson.loads(info))
+
+    def search(self,
+               name: Optional[str] = None,
+               info: Optional[dict[str, Any]] = None,
+               created_from: Optional[str] = None,
+               created_to: Optional[str] = None,
+               min_size: Optional[int] = None,
+               limit: Optional[int] = None) -> list[LocalBagEntry]:
+        """
+        Query the index (not the file system, see reconcile). All given filters must match.
+
+        @param name: bag name or glob pattern
+        @param info: bag-info tags and values the bag must have
+        @param created_from: earliest Bagging-Date (iso, inclusive)
+        @param created_to: latest Bagging-Date (iso, inclusive)
+        """
+        clauses, params = [], []
+        if name is not None:
+            clauses.append("name GLOB ?")
+            params.append(name)
+        for key, value in (info or {}).items():
+            clauses.append("json_extract(info, ?) = ?")
+            params.extend([f'$."{key}"', value])
+        if created_from is not None:
+            clauses.append("created >= ?")
+            params.append(created_from)
+        if created_to is not None:
+            clauses.append("created <= ?")
+            params.append(created_to)
+        if min_size is not None:
+            clauses.append("size >= ?")
+            params.append(min_size)
+        sql = "SELECT name, path, size, octets, streams, created, info FROM bags"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY name"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [self._entry(row) for row in self._conn.execute(sql, params)]
+
+    def get(self, name: str) -> Optional[LocalBagEntry]:
+        found = self.search(name=name.replace("[", "[[]").replace("*", "[*]").replace("?", "[?]"), limit=1)
+        return found[0] if found else None
+
+
+@lru_cache
+def bag_catalog() -> BagCatalog:
+    return BagCatalog(Path(ad))
+
 
-def list_local_bags() -> list[str]:
-    pass
\ No newline at end of file
+def list_local_bags(reconcile: bool = True) -> list[str]:
+    """names of the local bags"""
+    if reconcile:
+        bag_catalog().reconcile()
+    return [entry.name for entry in bag_catalog().search()]
\ No newline at end of file
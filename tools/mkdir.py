@@ -92,22 +92,28 @@ class SmartPath(type(Path())):
             else:  # ignore
                 self.valid = True
 
+    def with_segments(self, *pathsegments) -> Path:
+        # derived paths (joins, parent, glob results, ...) are plain paths,
+        # constructing a SmartPath creates folders
+        return Path(*pathsegments)
+
     def __truediv__(self, key: Union[
         str, Path, 'SmartPath', tuple[exist_literal, Union[str, Path, 'SmartPath'], Optional[dict]]]) -> 'SmartPath':
         """
         Override the division operator to join paths and create directories.
 
         Args:
-            key: Path component to join (string or Path-like object)
+            key: Path component to join (string or Path-like object),
+                 or (exist, path) / (exist, path, data) to pass the SmartPath keywords
 
         Returns:
             SmartPath: A new SmartPath instance for the joined path
         """
         if isinstance(key, tuple):
             if len(key) >= 3:
-                kws = {"exist": key[1], "data": key[2]}
+                kws = {"exist": key[0], "data": key[2]}
             elif len(key) == 2:
-                kws = {"exist": key[1], "data": None}
+                kws = {"exist": key[0], "data": None}
             else:
                 kws = {"exist": "not-set", "data": None}
             return SmartPath(super().__truediv__(key[1]), **kws)
@@ -123,13 +129,15 @@ class SmartPath(type(Path())):
     def get_path(self) -> Path:
         return self
 
-    def create_bag(self, info: dict) -> "MBag":
+    def create_bag(self, info: dict, processes: Optional[int] = None) -> "MBag":
         try:
             import bagit
         except ImportError:
             print("Please install bagit to use this function")
-        bag = bagit.make_bag(self, info)
-        return MBag(self, bag)
+        from tools.checksums import make_bag
+        from tools.experiment.inner_bag import MBag
+        bag = make_bag(self, info, processes=processes)
+        return MBag(self, bag, processes)
 
     def versioned(self) -> 'SmartPath':
         """
@@ -175,7 +183,7 @@ class SmartPath(type(Path())):
         next_version = 0 if not version_numbers else max(version_numbers) + 1
 
         # Create new path with version number
-        new_path = parent / ("error", f"{base_stem}_{next_version}{suffix}")
+        new_path = SmartPath(parent) / ("error", f"{base_stem}_{next_version}{suffix}")
 
         # EXISING CHECKING
         """ options:
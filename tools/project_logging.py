@@ -33,6 +33,7 @@ from typing import Any, Optional
 from tools.data_folder import base_data_folder
 from tools.env_root import root
 from tools.files import save_json
+from tools.instrumentation import instrument
 
 # Default logging configuration with file handlers
 DEFAULT_LOG_CONFIG = {
@@ -136,7 +137,6 @@ class LoggingManager:
                 self.config_path = SmartPath(config_path)
             else:
                 self.config_path = SmartPath(base_data_folder() / "log_conf.json", **{"data": DEFAULT_LOG_CONFIG})
-            self.config_path / ("txt-logs", "create", DEFAULT_LOG_CONFIG)
             # self.config_path = config_path
             self.project_root = project_root
             self.config_data: Optional[dict[str, Any]] = None
@@ -185,6 +185,7 @@ class LoggingManager:
             #print(self.config_data)
             logging.config.dictConfig(self.config_data)
 
+    @instrument("LoggingManager.add_logger")
     def add_logger(self, name: str) -> None:
         """
         Add a new logger configuration.
@@ -0,0 +1,230 @@
+"""
+Record files (.records): lists of pydantic models as msgpack, read by index from a memory map.
+
+Layout:
+- magic b"PPTREC1\\n"
+- the records, each a msgpack array of the field values (json mode, in the order of the header fields)
+- header (msgpack map): model ("module:qualname"), fields, count
+- index: offset of every record, uint64 little endian
+- footer: header offset, index offset, count (uint64 little endian) and the magic
+
+Opening a file only reads the footer and the header, a record is unpacked and validated when it is accessed.
+Records of models with only json native fields (str, int, float, bool, None, lists and dicts of them)
+can skip the validation (validate=False), the others are always validated (datetimes, paths and nested
+models are stored as their json values).
+
+Example:
+    ```python
+    write_records(path, records)
+    with RecordFile(path, Record) as data:
+        data[9_999_999]
+        data.raw(5)  # dict, no validation
+    ```
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from functools import lru_cache
+from types import NoneType, UnionType
+from typing import Any, Iterable, Iterator, Optional, Union, get_args, get_origin, overload
+
+from pydantic import BaseModel
+
+MAGIC = b"PPTREC1\n"
+RECORDS_SUFFIX = ".records"
+_FOOTER = struct.Struct("<QQQ8s")
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError("msgpack not installed")
+    return msgpack
+
+
+def write_records(path: Union[str, Path], models: Iterable[BaseModel], model: Optional[type[BaseModel]] = None) -> int:
+    """
+    Write models (all of the same type) to a record file, streaming, as .part until complete.
+
+    :param model: the model type, default the type of the first model
+    :return: number of records
+    """
+    msgpack = _msgpack()
+    path = Path(path)
+    part_path = path.with_name(f"{path.name}.part")
+    packer = msgpack.Packer(use_bin_type=True, default=str)
+    offsets = array("Q")
+    fields: Optional[list[str]] = list(model.model_fields) if model else None
+    try:
+        with part_path.open("wb") as f:
+            f.write(MAGIC)
+            offset = len(MAGIC)
+            for item in models:
+                if fields is None:
+                    model = type(item)
+                    fields = list(model.model_fields)
+                values = item.model_dump(mode="json")
+                content = packer.pack([values[name] for name in fields])
+                offsets.append(offset)
+                f.write(content)
+                offset += len(content)
+            offsets.append(offset)  # end of the last record
+            header_offset = offset
+            header = {"model": f"{model.__module__}:{model.__qualname__}" if model else None,
+                      "fields": fields or [], "count": len(offsets) - 1}
+            f.write(packer.pack(header))
+            index_offset = f.tell()
+            if sys.byteorder == "big":
+                offsets.byteswap()
+            f.write(offsets.tobytes())
+            f.write(_FOOTER.pack(header_offset, index_offset, len(offsets) - 1, MAGIC))
+        os.replace(part_path, path)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+    return len(offsets) - 1
+
+
+_JSON_NATIVE = (str, int, float, bool, NoneType, Any)
+
+
+def _json_native(annotation: Any) -> bool:
+    """values of annotation are the same in python and json mode"""
+    if annotation in _JSON_NATIVE:
+        return True
+    origin = get_origin(annotation)
+    if origin in (list, dict, Union, UnionType):
+        return all(_json_native(arg) for arg in get_args(annotation))
+    return False
+
+
+@lru_cache
+def _constructible(model: type[BaseModel]) -> bool:
+    """records of model can be model_construct-ed from their json values"""
+    return all(_json_native(field.annotation) and not field.metadata for field in model.model_fields.values())
+
+
+class RecordFile:
+    """
+    Random access to a record file through a memory map. Items are models (validated on access),
+    or dicts when no model is given.
+
+    @param model: model type of the records, default: dicts
+    @param validate: model_validate the records, otherwise model_construct (trusted data, faster) when all fields
+        of model are json native
+    """
+
+    def __init__(self, path: Union[str, Path], model: Optional[type[BaseModel]] = None, validate: bool = True):
+        self._unpackb = _msgpack().unpackb
+        self.path = Path(path)
+        self.model = model
+        # json values of datetimes, paths or nested models need the validation to become python values
+        self.validate = validate or model is None or not _constructible(model)
+        with self.path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < len(MAGIC) + _FOOTER.size or self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a record file")
+        header_offset, index_offset, count, magic = _FOOTER.unpack_from(self._mm, len(self._mm) - _FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is incomplete")
+        self.header: dict = self._unpackb(self._mm[header_offset:index_offset])
+        self.fields: list[str] = self.header["fields"]
+        self._count = count
+        index = memoryview(self._mm)[index_offset:index_offset + 8 * (count + 1)]
+        if sys.byteorder == "big":
+            swapped = array("Q", index)
+            swapped.byteswap()
+            self._index: Any = swapped
+        else:
+            self._index = index.cast("Q")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def raw(self, i: int) -> dict:
+        """record i as a dict of json values"""
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("record index out of range")
+        values = self._unpackb(self._mm[self._index[i]:self._index[i + 1]])
+        return dict(zip(self.fields, values))
+
+    @overload
+    def __getitem__(self, i: int) -> Union[BaseModel, dict]: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[Union[BaseModel, dict]]: ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        data = self.raw(i)
+        if self.model is None:
+            return data
+        return self.model.model_validate(data) if self.validate else self.model.model_construct(**data)
+
+    def __iter__(self) -> Iterator[Union[BaseModel, dict]]:
+        for i in range(self._count):
+            yield self[i]
+
+    def close(self) -> None:
+        if isinstance(self._index, memoryview):
+            self._index.release()
+        self._mm.close()
+
+    def __enter__(self) -> "RecordFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    import gc
+    import tempfile
+    import time
+    from datetime import datetime, timedelta
+
+    from tools.files import read_data, save_json
+    from tools.pydantic_annotated_types import FastSerializableDatetime, FastSerializablePath
+
+    class Measurement(BaseModel):
+        id: int
+        taken: FastSerializableDatetime
+        source: FastSerializablePath
+        values: list[float]
+
+    now = datetime.now()
+    count = 1_000_000
+    measurements = [Measurement(id=i, taken=now + timedelta(seconds=i), source=Path(f"/data/{i % 100}.csv"),
+                                values=[i * 0.5, i * 0.25]) for i in range(count)]
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, records_path = Path(tmp) / "measurements.json", Path(tmp) / "measurements.records"
+        for path, write in ((json_path, lambda: save_json(json_path, measurements, indent_2=False)),
+                            (records_path, lambda: write_records(records_path, measurements))):
+            start = time.perf_counter()
+            write()
+            print(f"write {path.name}: {time.perf_counter() - start:.2f}s, {path.stat().st_size / 2 ** 20:.1f}MB")
+        del measurements
+        gc.collect()
+
+        picks = range(0, count, count // 1000)
+        start = time.perf_counter()
+        loaded = [Measurement.model_validate(m) for m in read_data(json_path)]
+        opened = time.perf_counter()
+        [loaded[i] for i in picks]
+        print(f"json: read and validate {opened - start:.2f}s")
+        del loaded
+        gc.collect()
+
+        start = time.perf_counter()
+        with read_data(records_path, {"model": Measurement}) as data:
+            opened = time.perf_counter()
+            [data[i] for i in picks]
+            done = time.perf_counter()
+        print(f"records: open {(opened - start) * 1000:.2f}ms, {len(picks)} records by index {(done - opened) * 1000:.2f}ms")
@@ -0,0 +1,129 @@
+"""
+JSON schema validators that are compiled once per distinct schema and cached by schema hash.
+
+Backends:
+- "jsonschema": validator class of the schema's draft, reports all errors
+- "fastjsonschema": generated python code, faster, reports the first error only (optional dependency)
+
+Example:
+    ```python
+    from tools.schema_validation import validate, validate_many
+
+    validate({"n": 1}, schema)
+    errors = validate_many(docs, schema)  # [(index, message), ...]
+    ```
+"""
+import hashlib
+import threading
+from typing import Optional, Iterable, Iterator, Literal, Callable, Any
+
+import orjson
+
+backend_literal = Literal["jsonschema", "fastjsonschema"]
+
+DEFAULT_BACKEND: backend_literal = "jsonschema"
+
+_VALIDATORS: dict[tuple[str, str], "CompiledValidator"] = {}
+_LOCK = threading.Lock()
+
+
+def schema_key(schema: dict) -> str:
+    return hashlib.sha256(orjson.dumps(schema, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class CompiledValidator:
+
+    def __init__(self, schema: dict, backend: backend_literal = DEFAULT_BACKEND):
+        self.schema = schema
+        self.backend = backend
+        if backend == "fastjsonschema":
+            try:
+                import fastjsonschema
+            except ImportError:
+                raise ImportError("fastjsonschema not installed")
+            self._exception = fastjsonschema.JsonSchemaValueException
+            self._fast_validate: Callable[[Any], Any] = fastjsonschema.compile(schema)
+        else:
+            from jsonschema.validators import validator_for
+            validator_cls = validator_for(schema)
+            validator_cls.check_schema(schema)
+            self._validator = validator_cls(schema)
+
+    def iter_errors(self, instance: Any) -> Iterator[str]:
+        if self.backend == "fastjsonschema":
+            try:
+                self._fast_validate(instance)
+            except self._exception as e:
+                yield e.message
+        else:
+            for error in self._validator.iter_errors(instance):
+                yield error.message
+
+    def first_error(self, instance: Any) -> Optional[str]:
+        return next(self.iter_errors(instance), None)
+
+    def validate(self, instance: Any) -> None:
+        error = self.first_error(instance)
+        if error is not None:
+            raise ValueError(f"Data validation error: {error}")
+
+
+def get_validator(schema: dict, backend: Optional[backend_literal] = None) -> CompiledValidator:
+    """Compiled validator for schema, cached by schema hash and backend"""
+    backend = backend or DEFAULT_BACKEND
+    key = (schema_key(schema), backend)
+    validator = _VALIDATORS.get(key)
+    if validator is None:
+        with _LOCK:
+            validator = _VALIDATORS.get(key)
+            if validator is None:
+                validator = _VALIDATORS[key] = CompiledValidator(schema, backend)
+    return validator
+
+
+def validate(instance: Any, schema: dict, backend: Optional[backend_literal] = None) -> None:
+    """Raises ValueError for an invalid instance"""
+    get_validator(schema, backend).validate(instance)
+
+
+def validate_many(instances: Iterable[Any],
+                  schema: dict,
+                  backend: Optional[backend_literal] = None) -> list[tuple[int, str]]:
+    """All validation errors of instances as (index, message)"""
+    validator = get_validator(schema, backend)
+    return [(idx, message) for idx, instance in enumerate(instances) for message in validator.iter_errors(instance)]
+
+
+if __name__ == "__main__":
+    import timeit
+
+    bench_schema = {
+        "type": "object",
+        "properties": {
+            "id": {"type": "integer"},
+            "name": {"type": "string", "minLength": 1},
+            "tags": {"type": "array", "items": {"type": "string"}},
+            "score": {"type": "number", "minimum": 0},
+        },
+        "required": ["id", "name"],
+    }
+    bench_docs = [{"id": i, "name": f"doc {i}", "tags": ["a", "b"], "score": i / 3} for i in range(2_000)]
+
+    def run_uncached():
+        import jsonschema
+        for doc in bench_docs:
+            jsonschema.validate(doc, bench_schema)
+
+    def run_backend(name: backend_literal):
+        def run():
+            for doc in bench_docs:
+                validate(doc, bench_schema, name)
+        return run
+
+    print(f"{len(bench_docs)} documents")
+    print(f"jsonschema.validate (uncached): {timeit.timeit(run_uncached, number=1):.3f}s")
+    print(f"cached jsonschema:              {timeit.timeit(run_backend('jsonschema'), number=1):.3f}s")
+    try:
+        print(f"cached fastjsonschema:          {timeit.timeit(run_backend('fastjsonschema'), number=1):.3f}s")
+    except ImportError as err:
+        print(err)
@@ -0,0 +1,69 @@
+"""
+Throughput counter for long-running operations (ingest, export, conversion, hashing, transfers).
+
+Example:
+    ```python
+    tp = Throughput()
+    for batch in batches:
+        ...
+        tp.add(len(batch), nbytes)
+    print(tp.stop().summary("rows"))
+    ```
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Any
+
+import humanize
+
+
+@dataclass
+class Throughput:
+    items: int = 0
+    bytes: int = 0
+    skipped: int = 0
+    errors: list[str] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    finished: Optional[float] = None
+
+    def add(self, items: int = 1, nbytes: int = 0) -> None:
+        self.items += items
+        self.bytes += nbytes
+
+    def stop(self) -> "Throughput":
+        self.finished = time.perf_counter()
+        return self
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def summary(self, unit: str = "items") -> str:
+        text = f"{self.items} {unit} in {self.seconds:.2f}s ({self.items_per_second:.1f} {unit}/s"
+        if self.bytes:
+            text += f", {humanize.naturalsize(self.bytes)}, {humanize.naturalsize(self.bytes_per_second)}/s"
+        text += ")"
+        if self.skipped:
+            text += f", {self.skipped} skipped"
+        if self.errors:
+            text += f", {len(self.errors)} errors"
+        return text
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "items": self.items,
+            "bytes": self.bytes,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "seconds": self.seconds,
+            "items_per_second": self.items_per_second,
+            "bytes_per_second": self.bytes_per_second,
+        }
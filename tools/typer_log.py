@@ -4,6 +4,7 @@ from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from tools import instrumentation
 from tools.project_logging import get_logger
 
 try:
@@ -72,6 +73,8 @@ try:
                 row["duration"] = humanize.naturaldelta(datetime.now() - start)
                 if res and isinstance(res, Path):
                     row["result"] = str(res)
+                if instrumentation.enabled():
+                    row["metrics"] = instrumentation.snapshot()
                 with log_fp.open("a", encoding="utf-8") as fout:
                     fout.write(json.dumps(row, default=safe_serializer) + os.linesep)
 
@@ -187,6 +190,30 @@ try:
 
         typer_app.command()(overview)
 
+    def add_metrics_command(typer_app: typer.Typer, log_fp: Optional[Path] = None):
+
+        def metrics(output_format: str = typer.Option("prometheus", "--format", help="prometheus or json"),
+                    command: Optional[str] = typer.Option(None, help="metrics of the last run of this command")) -> None:
+            """
+            Print the instrumentation metrics of the last logged command (run with TOOLS_INSTRUMENTATION=1).
+            """
+            path = log_fp or root() / "data/typer-log.jsonl"
+            data = None
+            if path.exists():
+                for line in path.read_text(encoding="utf-8").splitlines():
+                    row = json.loads(line) if line.strip() else {}
+                    if "metrics" in row and (command is None or row.get("command") == command):
+                        data = row["metrics"]
+            if data is None:
+                print(f"no metrics in {path}, run a command with {instrumentation.INSTRUMENTATION_ENV}=1")
+                return
+            if output_format == "json":
+                print(instrumentation.to_json(data).decode())
+            else:
+                print(instrumentation.to_prometheus(data), end="")
+
+        typer_app.command()(metrics)
+
 except ModuleNotFoundError as err:
     get_logger(__file__).error(err)
     def patch_typer_invoke(_):
@@ -1,6 +1,17 @@
 from csv import DictWriter
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, TextIO
+
+
+def write_csv_rows(f: TextIO,
+                   fieldnames: list[str],
+                   rows: Iterable[dict],
+                   write_header: bool = True) -> None:
+    """Write rows to an open text stream (e.g. a compressed file). rows can be a generator"""
+    writer = DictWriter(f, fieldnames)
+    if write_header:
+        writer.writeheader()
+    writer.writerows(rows)
 
 
 def write_csv(destination: Path,
@@ -12,11 +23,6 @@ def write_csv(destination: Path,
         return False
     if destination.exists() and not exist_ok:
         return False
-    with destination.open("w", encoding=encoding) as f:
-        writer = DictWriter(f, fieldnames)
-        if write_header:
-            writer.writeheader()
-        writer.writerows(rows)
-
-
-
+    with destination.open("w", encoding=encoding, newline="") as f:
+        write_csv_rows(f, fieldnames, rows, write_header)
+    return True
@@ -1,12 +1,36 @@
+import argparse
+import multiprocessing
 import xml.etree.ElementTree as ET
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Optional, Union, Iterator, IO, Literal
+
+import orjson
+
+from tools import yaml_backend
+from tools.files import atomic_write
+from tools.throughput import Throughput
 
 try:
     import xmltodict
-    import yaml
 except ImportError:
     print("Install the optional dependencies [xml2yaml]")
 
+# elements that commonly appear multiple times, always start as a list
+LIST_TAGS = ['View', 'Choice', 'Image']
+
+
+def _add_child(child_dict: Dict[str, Any], child_name: str, child_content: Dict[str, Any]) -> None:
+    if child_name in child_dict:
+        if not isinstance(child_dict[child_name], list):
+            child_dict[child_name] = [child_dict[child_name]]
+        child_dict[child_name].append(child_content)
+    elif child_name in LIST_TAGS:
+        child_dict[child_name] = [child_content]
+    else:
+        child_dict[child_name] = child_content
+
+
 def xml_to_dict(element: ET.Element) -> Dict[str, Any]:
     """Convert XML element to dictionary with attributes."""
     result = {}
@@ -20,19 +44,7 @@ def xml_to_dict(element: ET.Element) -> Dict[str, Any]:
     if children:
         child_dict = {}
         for child in children:
-            child_name = child.tag
-            child_content = xml_to_dict(child)
-
-            if child_name in child_dict:
-                if not isinstance(child_dict[child_name], list):
-                    child_dict[child_name] = [child_dict[child_name]]
-                child_dict[child_name].append(child_content)
-            else:
-                # For elements that commonly appear multiple times, always start as a list
-                if child_name in ['View', 'Choice', 'Image']:
-                    child_dict[child_name] = [child_content]
-                else:
-                    child_dict[child_name] = child_content
+            _add_child(child_dict, child.tag, xml_to_dict(child))
 
         # If there are any children, store them directly under the parent
         for key, value in child_dict.items():
@@ -41,6 +53,67 @@ def xml_to_dict(element: ET.Element) -> Dict[str, Any]:
     return result
 
 
+def iter_xml_records(source: Union[str, Path, IO[bytes]],
+                     record_tag: Optional[str] = None,
+                     text_key: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Convert XML to dicts like xml_to_dict, but iteratively (iterparse with an explicit stack),
+    so deep documents don't hit the recursion limit. Processed elements are cleared.
+
+    :param source: file path or binary file object
+    :param record_tag: yield one dict per element with this tag, elements outside of records are dropped.
+        Without record_tag, a single dict for the root element is yielded
+    :param text_key: store non-blank element text under this key (e.g. "#text"). Default: text is ignored
+    """
+    # (attributes, children) of the open elements that are collected
+    stack: list[tuple[Dict[str, Any], Dict[str, Any]]] = []
+    # open elements and if they are collected
+    open_elements: list[tuple[ET.Element, bool]] = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            collect = record_tag is None or bool(stack) or elem.tag == record_tag
+            if collect:
+                stack.append((dict(elem.attrib), {}))
+            open_elements.append((elem, collect))
+            continue
+
+        _, collected = open_elements.pop()
+        if collected:
+            attributes, children = stack.pop()
+            content = {**attributes, **children}
+            if text_key and elem.text and elem.text.strip():
+                content[text_key] = elem.text.strip()
+            if stack:
+                _add_child(stack[-1][1], elem.tag, content)
+            else:
+                yield content
+        elem.clear()
+        if open_elements:
+            open_elements[-1][0].remove(elem)
+
+
+def xml_file_to_jsonl(source: Union[str, Path], destination: Path, record_tag: str,
+                      text_key: Optional[str] = None) -> int:
+    """Stream the record_tag elements of an XML file into a JSONL file. Returns the number of records"""
+    count = 0
+    with destination.open("wb") as f:
+        for record in iter_xml_records(source, record_tag, text_key):
+            f.write(orjson.dumps(record) + b"\n")
+            count += 1
+    return count
+
+
+def xml_file_to_yaml(source: Union[str, Path], destination: Path, record_tag: str,
+                     text_key: Optional[str] = None) -> int:
+    """Stream the record_tag elements of an XML file into a YAML list. Returns the number of records"""
+    count = 0
+    with destination.open("w", encoding="utf-8") as f:
+        for record in iter_xml_records(source, record_tag, text_key):
+            yaml_backend.dump([record], f, allow_unicode=True, sort_keys=False)
+            count += 1
+    return count
+
+
 def dict_to_xml(data: Dict[str, Any], tag_name: str) -> ET.Element:
     """Convert dictionary to XML element."""
     element = ET.Element(tag_name)
@@ -64,30 +137,93 @@ def dict_to_xml(data: Dict[str, Any], tag_name: str) -> ET.Element:
 
 def xml_to_yaml(xml_string: str) -> str:
     """Convert XML string to YAML string."""
-    return yaml.dump(xmltodict.parse(xml_string))
+    return yaml_backend.dump(xmltodict.parse(xml_string))
 
 
 def yaml_to_xml(yaml_string: str) -> str:
     """Convert YAML string to XML string."""
-    data = yaml.safe_load(yaml_string)
+    data = yaml_backend.load(yaml_string)
     return xmltodict.unparse(data)
 
+direction_literal = Literal["xml2yaml", "yaml2xml"]
+
+_SOURCE_SUFFIXES: dict[str, tuple[str, ...]] = {"xml2yaml": (".xml",), "yaml2xml": (".yaml", ".yml")}
+_TARGET_SUFFIX: dict[str, str] = {"xml2yaml": ".yaml", "yaml2xml": ".xml"}
+
+
+def convert_file(source: Path, destination: Path, direction: direction_literal = "xml2yaml") -> tuple[int, Optional[str]]:
+    """Convert one file (atomic write). Returns the source size and an error message"""
+    try:
+        content = source.read_text(encoding="utf-8")
+        output = xml_to_yaml(content) if direction == "xml2yaml" else yaml_to_xml(content)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(destination, output)
+        return len(content), None
+    except Exception as err:
+        return 0, f"{source}: {err}"
+
+
+def _convert_job(job: tuple[Path, Path, direction_literal]) -> tuple[int, Optional[str]]:
+    return convert_file(*job)
+
+
+def convert_directory(source_dir: Path,
+                      destination_dir: Optional[Path] = None,
+                      direction: direction_literal = "xml2yaml",
+                      workers: Optional[int] = None,
+                      force: bool = False) -> Throughput:
+    """
+    Convert all files of a directory tree in a process pool.
+    Files whose output is newer than the source are skipped, unless force.
+
+    :param destination_dir: output tree, default: next to the source files. yaml2xml needs a separate tree,
+        next to the sources the generated .xml would overwrite the original xml files.
+    :return: throughput (items: converted files, bytes: source bytes, skipped, errors)
+    """
+    if direction == "yaml2xml" and (destination_dir is None
+                                    or Path(destination_dir).resolve() == Path(source_dir).resolve()):
+        raise ValueError("yaml2xml needs a destination_dir other than the source directory")
+    destination_dir = destination_dir or source_dir
+    throughput = Throughput()
+    jobs = []
+    for source in sorted(source_dir.rglob("*")):
+        if source.suffix not in _SOURCE_SUFFIXES[direction] or not source.is_file():
+            continue
+        destination = (destination_dir / source.relative_to(source_dir)).with_suffix(_TARGET_SUFFIX[direction])
+        if not force and destination.exists() and destination.stat().st_mtime_ns >= source.stat().st_mtime_ns:
+            throughput.skipped += 1
+            continue
+        jobs.append((source, destination, direction))
+
+    if jobs:
+        # spawn: no fork of a possibly multi-threaded parent
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for size, error in pool.map(_convert_job, jobs, chunksize=max(1, len(jobs) // 64)):
+                if error:
+                    throughput.errors.append(error)
+                else:
+                    throughput.add(1, size)
+    return throughput.stop()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Convert a directory of XML files to YAML (or back)")
+    parser.add_argument("source", type=Path, help="directory with the files to convert")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="output directory (default: next to the sources, required with --reverse)")
+    parser.add_argument("--reverse", action="store_true", help="convert YAML to XML")
+    parser.add_argument("-w", "--workers", type=int, help="number of processes (default: cpu count)")
+    parser.add_argument("-f", "--force", action="store_true", help="also convert files with up-to-date output")
+    args = parser.parse_args(argv)
+    if args.reverse and not args.output:
+        parser.error("--reverse needs an --output directory, the sources directory may contain the original xml")
+
+    result = convert_directory(args.source, args.output, "yaml2xml" if args.reverse else "xml2yaml",
+                               args.workers, args.force)
+    for error in result.errors:
+        print(error)
+    print(result.summary("files"))
+
+
 if __name__ == "__main__":
-    # Test with input
-    xml_input = '''<View>
-        <View>
-            <Header value="Choose a relevance class for the text"/>
-            <HyperText name="post_text" value="$post_text"/>
-            <Choices name="text_relevant" toName="post_text" choice="single" showInline="true">
-                <Choice value="Relevant"/>
-                <Choice value="Uncertain"/>
-                <Choice value="Not relevant"/>
-            </Choices>
-        </View>
-        <!-- Rest of your XML -->
-    </View>'''
-
-    # Convert XML to YAML
-    yaml_output = xml_to_yaml(xml_input)
-    print("XML to YAML:")
-    print(yaml_output)
\ No newline at end of file
+    main()
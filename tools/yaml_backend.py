@@ -0,0 +1,85 @@
+"""
+YAML loading and dumping through the libyaml C implementation (CSafeLoader/CSafeDumper) when
+PyYAML was built with it, the pure python classes otherwise.
+Loading is safe by default. Paths are dumped as posix strings.
+
+Example:
+    ```python
+    from tools import yaml_backend
+
+    with path.open("rb") as f:
+        for doc in yaml_backend.load_all(f):
+            ...
+    ```
+"""
+from pathlib import PurePath
+from typing import Any, Iterable, Iterator, Optional, IO
+
+import yaml
+
+HAS_LIBYAML: bool = getattr(yaml, "__with_libyaml__", False)
+
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+# full loader, constructs python objects. only for trusted files
+UnsafeLoader = getattr(yaml, "CLoader", yaml.Loader)
+
+
+class SafeDumper(getattr(yaml, "CSafeDumper", yaml.SafeDumper)):
+    pass
+
+
+SafeDumper.add_multi_representer(PurePath, lambda dumper, path: dumper.represent_str(path.as_posix()))
+
+
+def _loader(safe: bool):
+    return SafeLoader if safe else UnsafeLoader
+
+
+def load(stream: str | bytes | IO, safe: bool = True) -> Any:
+    return yaml.load(stream, Loader=_loader(safe))
+
+
+def load_all(stream: str | bytes | IO, safe: bool = True) -> Iterator[Any]:
+    """Documents of a multi-document stream, one at a time"""
+    yield from yaml.load_all(stream, Loader=_loader(safe))
+
+
+def dump(data: Any, stream: Optional[IO] = None, **kwargs) -> Optional[str]:
+    """yaml.dump with the (C) safe dumper. Returns a string when no stream is given"""
+    return yaml.dump(data, stream, Dumper=SafeDumper, **kwargs)
+
+
+def dump_all(documents: Iterable[Any], stream: Optional[IO] = None, **kwargs) -> Optional[str]:
+    """Write documents as a multi-document stream (separated by ---), can be a generator"""
+    return yaml.dump_all(documents, stream, Dumper=SafeDumper, **kwargs)
+
+
+if __name__ == "__main__":
+    import io
+    import sys
+    import time
+    from pathlib import Path
+
+    if len(sys.argv) > 1:
+        content = Path(sys.argv[1]).read_bytes()
+    else:
+        # synthetic config of about 1.5MB
+        data = {f"section_{i}": {"name": f"item {i}", "values": list(range(20)), "enabled": i % 2 == 0,
+                                 "nested": {"a": 1.5, "b": "text", "c": [{"k": "v"}] * 3}}
+                for i in range(5_000)}
+        content = yaml.dump(data, Dumper=yaml.SafeDumper).encode()
+    print(f"{len(content) / 1e6:.1f}MB yaml, libyaml available: {HAS_LIBYAML}")
+
+    start = time.perf_counter()
+    data = yaml.load(content, Loader=yaml.SafeLoader)
+    print(f"load python SafeLoader: {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    data = load(content)
+    print(f"load {SafeLoader.__name__}: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    yaml.dump(data, io.StringIO(), Dumper=yaml.SafeDumper)
+    print(f"dump python SafeDumper: {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    dump(data, io.StringIO())
+    print(f"dump {SafeDumper.__mro__[1].__name__}: {time.perf_counter() - start:.2f}s")